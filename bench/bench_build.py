@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+import sys, time, random, warnings
+import pandas as pd
+from scraper_latest.build_dataset import compute_difficulty_index, link_ratings
+from bench.synthetic import make_rows
+
+BASE_ROWS = 20_000
+# linking is per rating row against the whole base list; beyond this only a prefix is linked
+LINK_MAX = 5_000
+SOURCES = ["RAEX","Interfax NRU","QS","THE","ARWU","Forbes","Expert","RUR"]
+YEARS = range(2006, 2026)
+
+def legacy_difficulty_index(df: pd.DataFrame) -> pd.DataFrame:
+    """The groupby().apply version compute_difficulty_index replaced, kept for comparison."""
+    def per_group(g: pd.DataFrame) -> pd.DataFrame:
+        g = g.copy().sort_values("rating_position")
+        n = len(g)
+        if n <= 1:
+            g["difficulty_index"] = 100
+            return g
+        g["rank_percentile"] = (g["rating_position"].rank(method="min") - 1) / (n - 1)
+        g["difficulty_index"] = ((1 - g["rank_percentile"]) * 100).round(0).astype("Int64")
+        return g
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return df.groupby(["rating_source","rating_year"], group_keys=False).apply(per_group)
+
+def rating_rows(n: int, seed: int=3):
+    """n rating rows spread over len(SOURCES) x len(YEARS) tables."""
+    rnd = random.Random(seed); out = []
+    for r in make_rows(n, seed):
+        out.append({"university": r["university"], "city": r["city"], "rating_source": rnd.choice(SOURCES),
+                    "rating_year": rnd.choice(YEARS), "rating_position": rnd.randint(1, 500)})
+    return out
+
+def timed(f, *a):
+    t = time.perf_counter(); r = f(*a); return r, time.perf_counter()-t
+
+def main(sizes):
+    base = pd.DataFrame([{"university": r["university"], "city": r["city"]} for r in make_rows(BASE_ROWS, 1)])
+    for n in sizes:
+        rows = rating_rows(n)
+        ratings, frame = timed(pd.DataFrame, rows)
+        _, legacy = timed(legacy_difficulty_index, ratings.copy())
+        ranked, diff = timed(compute_difficulty_index, ratings.copy())
+        linked = ranked.head(LINK_MAX)
+        merged, link = timed(link_ratings, base, linked)
+        _, records = timed(lambda: merged.to_dict(orient="records"))
+        print(f"ratings={n:>8}  frame {frame:5.2f}s  difficulty {diff:6.3f}s (apply {legacy:6.3f}s, x{legacy/diff:4.1f})  "
+              f"link {len(linked)} rows {link:6.2f}s  records {records:5.2f}s")
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [10_000, 100_000, 1_000_000])
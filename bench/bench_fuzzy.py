@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+import sys, time, random
+from services.fuzzy import FuzzyIndex
+from bench.synthetic import make_rows, CITIES, NAMES
+
+def typo(rnd, w):
+    if len(w) < 4: return w
+    i = rnd.randrange(1, len(w)-1); op = rnd.randrange(3)
+    if op == 0: return w[:i]+w[i+1:]
+    if op == 1: return w[:i]+w[i+1]+w[i]+w[i+2:]
+    return w[:i]+rnd.choice("аеиоукнтсрлм")+w[i+1:]
+
+def queries(n, seed=7):
+    rnd = random.Random(seed); base = ["мгту","мфти","spbgu","baumana","moskovskiy","питер","университет москва"]
+    out = []
+    for _ in range(n):
+        q = rnd.choice([
+            lambda: typo(rnd, rnd.choice(NAMES)),
+            lambda: f"{typo(rnd, rnd.choice(CITIES))} университет",
+            lambda: f"технический {rnd.choice(CITIES).lower()}",
+            lambda: rnd.choice(base),
+            lambda: typo(rnd, rnd.choice(CITIES)[:-1]+"ский")+" "+typo(rnd, "медицинский"),
+        ])()
+        out.append(q)
+    return out
+
+def main(sizes):
+    qs = queries(2000)
+    for n in sizes:
+        rows = make_rows(n)
+        t = time.perf_counter(); ix = FuzzyIndex(rows); build = time.perf_counter()-t
+        ts = []
+        for q in qs:
+            t = time.perf_counter(); ix.find(q, 10); ts.append(time.perf_counter()-t)
+        ts.sort(); pct = lambda p: ts[min(len(ts)-1, int(p*len(ts)))]*1e3
+        print(f"rows={n:>8} docs={len(ix.doc_rows):>7} vocab={len(ix.vocab):>7} build {build:.2f}s  "
+              f"p50 {pct(.5):.2f} ms  p90 {pct(.9):.2f} ms  p99 {pct(.99):.2f} ms  max {ts[-1]*1e3:.2f} ms")
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [10_000, 100_000, 1_000_000])
@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+import sys, gc, tracemalloc
+import orjson
+from services.store import Dataset
+from bench.synthetic import make_rows
+
+def measure(build):
+    gc.collect(); tracemalloc.start()
+    obj = build()
+    gc.collect(); cur, peak = tracemalloc.get_traced_memory(); tracemalloc.stop()
+    return obj, cur, peak
+
+def main(n):
+    # round-trip through JSON so strings and ints are fresh objects per row, like a real load
+    raw = orjson.dumps(make_rows(n))
+    rows, cur_rows, _ = measure(lambda: orjson.loads(raw))
+    ds, cur_ds, peak_ds = measure(lambda: Dataset.from_rows(rows))
+    assert len(ds) == len(rows) and ds[n//2] == rows[n//2]
+    mb = 1024*1024
+    print(f"rows={n}")
+    print(f"  list of dicts  {cur_rows/mb:8.1f} MiB")
+    print(f"  Dataset        {cur_ds/mb:8.1f} MiB  (peak while building {peak_ds/mb:.1f} MiB)")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500_000)
@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+import sys, time, statistics
+from services.search import search_items, SearchIndex
+from bench.synthetic import make_rows
+
+QUERIES = ["москва","мгу","баумана","технический университет","ского","raex 2024","нет такого вуза","ка"]
+
+def timeit(fn, repeat=5):
+    ts=[]
+    for _ in range(repeat):
+        t=time.perf_counter(); fn(); ts.append(time.perf_counter()-t)
+    return statistics.median(ts)
+
+def main(sizes):
+    for n in sizes:
+        data=make_rows(n)
+        t=time.perf_counter(); idx=SearchIndex(data); build=time.perf_counter()-t
+        print(f"rows={n:>8}  index build {build:.2f}s  grams={len(idx.postings)}")
+        for q in QUERIES:
+            assert search_items(data, q, 30, idx)==search_items(data, q, 30)
+            scan=timeit(lambda: search_items(data, q, 30), repeat=3 if n>=10**6 else 5)
+            fast=timeit(lambda: search_items(data, q, 30, idx))
+            print(f"  {q!r:>26}  scan {scan*1e3:9.2f} ms   index {fast*1e3:8.3f} ms")
+
+if __name__=="__main__":
+    main([int(a) for a in sys.argv[1:]] or [10_000, 100_000, 1_000_000])
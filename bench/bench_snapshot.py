@@ -0,0 +1,19 @@
+#!/usr/bin/env python3
+import os, sys, time, tempfile
+from services.state import build_state
+from services.snapshot import write_snapshot, load_snapshot
+from bench.synthetic import make_rows
+
+def main(sizes):
+    for n in sizes:
+        rows = make_rows(n)
+        t = time.perf_counter(); st = build_state(rows); build = time.perf_counter()-t
+        path = os.path.join(tempfile.gettempdir(), f"bench-{n}.snap")
+        t = time.perf_counter(); write_snapshot(path, st); write = time.perf_counter()-t
+        t = time.perf_counter(); load_snapshot(path); load = time.perf_counter()-t
+        print(f"rows={n:>8}  build from rows {build:6.2f}s  write {write:5.2f}s  "
+              f"load snapshot {load:5.2f}s  size {os.path.getsize(path)/2**20:7.1f} MiB")
+        os.unlink(path)
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [10_000, 100_000])
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""Hot-path benchmark suite over the seeded synthetic dataset.
+
+    python -m bench.suite                          # 1k, 10k and 100k rows -> bench/results.json
+    python -m bench.suite --sizes 1000000 --only search
+    python -m bench.suite --save-baseline          # store this run as bench/baseline.json
+    python -m bench.suite --fail-on-regression     # exit 1 when a median is THRESHOLD slower than the baseline
+
+Every result is the median (and p90) per call in milliseconds over several timed runs.
+"""
+import os, sys, json, time, asyncio, argparse, platform, statistics, subprocess, tempfile
+from itertools import islice
+from typing import Callable, Dict, Any, List
+
+os.environ.setdefault("TELEGRAM_TOKEN", "123456:bench")  # main refuses to import without one; nothing is sent
+
+import orjson
+from bench.synthetic import make_rows, CITIES
+from services.search import search_items, search_ranked, search_page, suggest_items, top_by_difficulty, facet_selection
+from services.facets import FacetFilter
+from services.state import build_state
+from services.loader import read_dataset
+from services.snapshot import write_snapshot, load_snapshot
+from services.cache import RESULTS
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RESULTS_PATH = os.path.join(HERE, "results.json")
+BASELINE_PATH = os.path.join(HERE, "baseline.json")
+THRESHOLD = 0.25
+# differences below this are timer noise, whatever the ratio
+NOISE_MS = 0.05
+QUERIES = ["москва", "мгу", "баумана", "технический университет", "ского", "raex 2024", "нет такого вуза", "ка"]
+FUZZY_QUERIES = ["московский университет", "томскй политех", "баумана", "спб экономический", "medicinskiy kazan", "вышка"]
+
+def measure(fn: Callable[[], Any], budget: float=0.5, min_runs: int=5, max_runs: int=200) -> Dict[str, float]:
+    fn()  # warm-up
+    ts: List[float] = []; start = time.perf_counter()
+    while len(ts) < max_runs and (len(ts) < min_runs or time.perf_counter() - start < budget):
+        t = time.perf_counter(); fn(); ts.append(time.perf_counter() - t)
+    ts.sort()
+    return {"median_ms": round(statistics.median(ts)*1e3, 4), "p90_ms": round(ts[int(0.9*(len(ts)-1))]*1e3, 4), "runs": len(ts)}
+
+def per_call(fn: Callable[[Any], Any], args: List[Any]) -> Callable[[], None]:
+    """One timed run calls fn for every arg; results are reported per call."""
+    def run():
+        for a in args: fn(a)
+    run.calls = len(args)
+    return run
+
+def bench_size(n: int, only: str, workdir: str) -> Dict[str, Dict[str, float]]:
+    out: Dict[str, Dict[str, float]] = {}
+    def record(name: str, fn: Callable[[], Any], **kw):
+        if only and only not in name: return
+        r = measure(fn, **kw); calls = getattr(fn, "calls", 1)
+        if calls > 1: r = {**r, "median_ms": round(r["median_ms"]/calls, 4), "p90_ms": round(r["p90_ms"]/calls, 4)}
+        out[f"{name}@{n}"] = r
+        print(f"  {name:<22} {r['median_ms']:10.3f} ms  p90 {r['p90_ms']:10.3f} ms  ({r['runs']} runs)", flush=True)
+    rows = make_rows(n)
+    path = os.path.join(workdir, f"data-{n}.json")
+    with open(path, "wb") as f: f.write(orjson.dumps(rows))
+    heavy = {"budget": 0.0, "min_runs": 3 if n < 500_000 else 1}
+    record("load.json", lambda: build_state(read_dataset(path, "json")), **heavy)
+    st = build_state(read_dataset(path, "json"))
+    snap = os.path.join(workdir, f"data-{n}.snap"); write_snapshot(snap, st)
+    record("load.snapshot", lambda: load_snapshot(snap), **heavy)
+    ds = st.data
+    record("search.index", per_call(lambda q: search_items(ds, q, 30, st.index), QUERIES))
+    record("search.fuzzy", per_call(lambda q: search_ranked(ds, q, 30, st.fuzzy), FUZZY_QUERIES))
+    cursors = [(q, c) for q in QUERIES for c in [search_page(ds, q, 20, st.index)[1]] if c is not None]
+    if cursors: record("search.next_page", per_call(lambda qc: search_page(ds, qc[0], 20, st.index, after=qc[1]), cursors))
+    keystrokes = [w[:i] for w in ("мгу", "московский гос", "казань", "санкт-петербургский", "инст") for i in range(1, len(w)+1)]
+    record("suggest.prefix", per_call(lambda q: suggest_items(ds, q, 100, st.prefix), keystrokes))
+    filters = [(None, None, None), ("RAEX", None, None), (None, 2024, None), ("Interfax NRU", 2025, "Москва"), (None, None, CITIES[5])]
+    record("top.boards", per_call(lambda f: top_by_difficulty(ds, 20, st.boards, *f), filters))
+    facets = [FacetFilter("Москва", "RAEX", 2024, 70), FacetFilter(CITIES[5], dmax=40), FacetFilter(year=2025, dmin=50, dmax=80)]
+    record("filter.select", per_call(lambda f: list(islice(facet_selection(ds, f, st.facets).rows(), 20)), facets))
+    faceted = [(f, q) for f in facets for q in ("", "университет", "ка")]
+    record("search.filtered", per_call(lambda fq: search_page(ds, fq[1], 20, st.index, sel=facet_selection(ds, fq[0], st.facets)), faceted))
+    if n <= 100_000:
+        record("top.scan", per_call(lambda f: top_by_difficulty(ds, 20, None, *f), filters[:2]), budget=0.2)
+    from handlers.basic import format_find, format_top, format_hit
+    page = search_items(ds, "университет", 20, st.index) or ds[:20]
+    top = top_by_difficulty(ds, 20, st.boards)
+    record("format.find", lambda: format_find(page))
+    record("format.top", lambda: format_top(top))
+    record("format.hit", lambda: format_hit(page))
+    format_find(page, st.fragments); format_top(top, st.fragments)
+    record("format.find_cached", lambda: format_find(page, st.fragments))
+    record("format.top_cached", lambda: format_top(top, st.fragments))
+    import main
+    from fastapi.testclient import TestClient
+    main.STATE = st
+    loop = asyncio.new_event_loop()
+    def handler(q):
+        RESULTS.clear(); loop.run_until_complete(main.http_find(q, 10))
+    record("find.handler", per_call(handler, QUERIES))
+    client = TestClient(main.app)
+    def http(q):
+        RESULTS.clear(); r = client.get("/find", params={"q": q, "limit": 10}); r.raise_for_status()
+    record("find.http", per_call(http, QUERIES))
+    record("find.http_cached", per_call(lambda q: client.get("/find", params={"q": q, "limit": 10}), QUERIES))
+    loop.close()
+    return out
+
+def git_rev() -> str:
+    try: return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=HERE).stdout.strip()
+    except OSError: return ""
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Names of benchmarks whose median regressed beyond threshold; prints the comparison table."""
+    regressed = []
+    print(f"\n{'benchmark':<32} {'baseline':>11} {'now':>11} {'ratio':>7}")
+    for name, r in results["results"].items():
+        b = baseline.get("results", {}).get(name)
+        if b is None: continue
+        old, new = b["median_ms"], r["median_ms"]
+        ratio = new/old if old else float("inf")
+        bad = ratio > 1 + threshold and new - old > NOISE_MS
+        if bad: regressed.append(name)
+        print(f"{name:<32} {old:9.3f}ms {new:9.3f}ms {ratio:6.2f}x{'  REGRESSION' if bad else ''}")
+    return regressed
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    ap.add_argument("--only", default="", help="run only benchmarks whose name contains this")
+    ap.add_argument("--out", default=RESULTS_PATH)
+    ap.add_argument("--baseline", default=BASELINE_PATH)
+    ap.add_argument("--threshold", type=float, default=THRESHOLD)
+    ap.add_argument("--save-baseline", action="store_true")
+    ap.add_argument("--fail-on-regression", action="store_true")
+    args = ap.parse_args(argv)
+    results = {"meta": {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "git": git_rev(), "python": platform.python_version(),
+                        "machine": platform.machine(), "platform": platform.platform(), "sizes": args.sizes}, "results": {}}
+    with tempfile.TemporaryDirectory(prefix="bench-") as workdir:
+        for n in args.sizes:
+            print(f"rows={n}", flush=True)
+            results["results"].update(bench_size(n, args.only, workdir))
+    with open(args.out, "w", encoding="utf-8") as f: json.dump(results, f, indent=2)
+    print(f"\nresults -> {args.out}")
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f: json.dump(results, f, indent=2)
+        print(f"baseline -> {args.baseline}"); return 0
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f: regressed = compare(results, json.load(f), args.threshold)
+        if regressed:
+            print(f"\n{len(regressed)} regression(s) over {args.threshold:.0%}: {', '.join(regressed)}")
+            if args.fail_on_regression: return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
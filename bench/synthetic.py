@@ -0,0 +1,62 @@
+import random
+from typing import List, Dict, Any, Tuple
+
+# city -> regional adjective used in university names (masculine form)
+CITY_ADJ = {
+    "Москва": "Московский", "Санкт-Петербург": "Санкт-Петербургский", "Новосибирск": "Новосибирский",
+    "Томск": "Томский", "Екатеринбург": "Уральский", "Казань": "Казанский", "Нижний Новгород": "Нижегородский",
+    "Пермь": "Пермский", "Самара": "Самарский", "Воронеж": "Воронежский", "Тюмень": "Тюменский",
+    "Красноярск": "Сибирский", "Челябинск": "Южно-Уральский", "Уфа": "Башкирский", "Иркутск": "Иркутский",
+    "Волгоград": "Волгоградский", "Ростов-на-Дону": "Южный", "Омск": "Омский", "Саратов": "Саратовский",
+    "Барнаул": "Алтайский", "Владивосток": "Дальневосточный", "Хабаровск": "Тихоокеанский",
+    "Калининград": "Балтийский", "Ярославль": "Ярославский", "Курск": "Курский",
+}
+CITIES = list(CITY_ADJ)
+# bigger cities host more universities
+CITY_WEIGHTS = [30, 18, 6, 5, 6, 6, 5, 4, 4, 4, 3, 4, 4, 3, 3, 3, 4, 3, 3, 2, 3, 2, 2, 2, 2]
+_CUM_WEIGHTS = [sum(CITY_WEIGHTS[:i+1]) for i in range(len(CITY_WEIGHTS))]
+# (noun, gender, specialisation adjective or "")
+KINDS: List[Tuple[str, str, str]] = [
+    ("университет", "m", ""), ("университет", "m", "технический"), ("университет", "m", "педагогический"),
+    ("университет", "m", "медицинский"), ("университет", "m", "экономический"), ("университет", "m", "аграрный"),
+    ("университет", "m", "политехнический"), ("университет", "m", "архитектурно-строительный"),
+    ("институт", "m", "технологический"), ("институт", "m", "юридический"), ("институт", "m", ""),
+    ("академия", "f", "медицинская"), ("академия", "f", "сельскохозяйственная"), ("академия", "f", "музыкальная"),
+]
+# (before the city adjective, after it)
+STATUS = {"m": [("", ""), ("", "государственный"), ("национальный исследовательский", "государственный"), ("", "федеральный")],
+          "f": [("", ""), ("", "государственная")]}
+NAMES = ["М.В. Ломоносова","Н.Э. Баумана","Н.И. Пирогова","Г.В. Плеханова","И.М. Губкина","Д.И. Менделеева",
+         "Н.И. Лобачевского","Б.Н. Ельцина","С.П. Королёва","Ю.А. Гагарина","В.И. Вернадского","А.С. Попова",
+         "А.Н. Туполева","Н.Е. Жуковского","И.М. Сеченова","И.П. Павлова","В.М. Бехтерева","П.А. Столыпина"]
+SOURCES = ["RAEX","Interfax NRU"]
+
+def fem(adj: str) -> str:
+    return adj[:-2]+"ая" if adj.endswith(("ый","ий","ой")) else adj
+
+def university_name(rnd: random.Random, city: str) -> str:
+    noun, gender, spec = rnd.choice(KINDS)
+    adj = CITY_ADJ[city]
+    pre, post = rnd.choice(STATUS[gender])
+    if gender == "f": adj = fem(adj)
+    parts = [pre, adj, post, spec, noun]
+    name = " ".join(p for p in parts if p)
+    if rnd.random() < 0.4: name += f" имени {rnd.choice(NAMES)}"
+    return name[0].upper()+name[1:]
+
+def make_rows(n: int, seed: int=42) -> List[Dict[str, Any]]:
+    """Seeded dataset rows shaped like latest.json: a university appears once per rating table it is in."""
+    rnd = random.Random(seed); out: List[Dict[str, Any]] = []
+    positions: Dict[Tuple[str, int], int] = {}
+    while len(out) < n:
+        city = rnd.choices(CITIES, cum_weights=_CUM_WEIGHTS)[0]
+        uni = university_name(rnd, city)
+        if rnd.random() < 0.2: uni += f" (филиал №{len(out)})"
+        tables = [(s, y) for s in SOURCES for y in (2024, 2025) if rnd.random() < 0.3]
+        if not tables: out.append({"university": uni, "city": city}); continue
+        for s, y in tables:
+            if len(out) >= n: break
+            pos = positions[(s, y)] = positions.get((s, y), 0) + rnd.randint(1, 3)
+            out.append({"university": uni, "city": city, "rating_source": s, "rating_year": y,
+                        "rating_position": pos, "difficulty_index": max(0, 100 - pos*100//max(1, n//2))})
+    return out
@@ -1,33 +1,78 @@
-import os
-from aiogram import Router, types
+import os, re, html, math, asyncio
+from aiogram import Router, types, F
+from aiogram.filters import Command
 from aiogram.enums import ParseMode
-from services.search import search_items, top_by_difficulty
+from services.search import search_page, ranked_page, search_ranked, suggest_items, top_by_difficulty, facet_selection
+from services.facets import FacetFilter
+from services.cache import RESULTS, PAGES
+from services.state import State
+from services.profiler import PROFILER, MODES
+from services.render import rating_label, find_line, top_line, TOP_PAGE
 
 router = Router()
 
-DATA = []
-def set_data_ref(ref):
-    global DATA
-    DATA = ref
+STATE = State()
+def set_data_ref(state):
+    global STATE
+    STATE = state
 
 ADMIN_ID = int(os.getenv("ADMIN_USER_ID","0") or "0")
+PAGE_SIZE = 20
+INLINE_PAGE = 20
+INLINE_MAX = 100
+# Telegram caches answers per query text for this long, so repeated keystrokes never reach the bot
+INLINE_CACHE_TIME = int(os.getenv("INLINE_CACHE_TIME","300") or "300")
 _force_reload = None
 def set_force_reload_ref(fn):
     global _force_reload
     _force_reload = fn
 
-@router.message(commands={"start"})
+def find_page(st, mode, query, start, filters=None):
+    """One /find or /filter page from cursor `start` (a row id for exact matches, a rank offset for fuzzy ones) and the next cursor."""
+    sel = facet_selection(st.data, filters, st.facets)
+    if mode == "fuzzy": return ranked_page(st.data, query, PAGE_SIZE, st.fuzzy, RESULTS, st.version, start, sel)
+    return search_page(st.data, query, PAGE_SIZE, st.index, RESULTS, st.version, start, 0, sel)
+
+def page_keyboard(token, page, has_next):
+    row = []
+    if page > 0: row.append(types.InlineKeyboardButton(text="← Назад", callback_data=f"pg:{token}:{page-1}"))
+    if has_next: row.append(types.InlineKeyboardButton(text="Далее →", callback_data=f"pg:{token}:{page+1}"))
+    return types.InlineKeyboardMarkup(inline_keyboard=[row]) if row else None
+
+def format_find(items, fragments=None):
+    if fragments is None: return "\n".join(find_line(r) for r in items)
+    return "\n".join([fragments.find_line(r.id) for r in items])
+
+def format_top(items, fragments=None):
+    if fragments is None: return "\n".join(f"{i}. {top_line(r)}" for i, r in enumerate(items, 1))
+    return "\n".join([f"{i}. {fragments.top_line(r.id)}" for i, r in enumerate(items, 1)])
+
+def format_hit(items):
+    top = items[0]; rating = rating_label(top)
+    return f"Нашёл: <b>{top.get('university') or '-'}</b> — {top.get('city') or '-'}{' | '+rating if rating else ''}\nСовпадений: {len(items)}"
+
+def inline_result(i, r):
+    rating = rating_label(r); uni = r.get("university") or "-"; city = r.get("city") or "-"
+    return types.InlineQueryResultArticle(
+        id=str(i), title=uni, description=city + (" | " + rating if rating else ""),
+        input_message_content=types.InputTextMessageContent(
+            message_text=f"<b>{html.escape(uni)}</b> — {html.escape(city)}" + (" | " + html.escape(rating) if rating else ""),
+            parse_mode=ParseMode.HTML))
+
+@router.message(Command("start"))
 async def cmd_start(message: types.Message):
     await message.answer(
         "Привет! Я помогу найти вузы и направления.\n"
         "Команды:\n"
         "• /find <запрос> — поиск по вузу/городу/коду/рейтингу\n"
-        "• /topdifficulty — ТОП-20 по индексу сложности (по рейтингам)\n"
-        "• /refresh (только админ) — вручную обновить базу",
+        "• /topdifficulty [источник] [год] [город] — ТОП-20 по индексу сложности (по рейтингам)\n"
+        "• /filter [город] [источник] [год] [70-100|&gt;70|&lt;50] [запрос] — вузы по фильтрам, можно с текстом\n"
+        "• /refresh (только админ) — вручную обновить базу\n"
+        "• /profile [cprofile|sample] [секунды] [Nr] (только админ) — профиль ближайших запросов",
         parse_mode=ParseMode.HTML,
     )
 
-@router.message(commands={"refresh"})
+@router.message(Command("refresh"))
 async def cmd_refresh(message: types.Message):
     if ADMIN_ID and message.from_user.id != ADMIN_ID:
         await message.answer("Недостаточно прав.")
@@ -38,55 +83,177 @@ async def cmd_refresh(message: types.Message):
     else:
         await message.answer("Функция обновления недоступна.")
 
-@router.message(commands={"find"})
+def parse_profile_args(text):
+    """`/profile sample 30 100r` -> ("sample", 30.0, 100): mode, seconds, requests (a number ending in r)."""
+    mode = "cprofile"; seconds = None; requests = 0
+    for w in (text or "").split()[1:]:
+        w = w.lower()
+        if w in MODES: mode = w
+        elif w[:-1].isdigit() and w[-1] == "r": requests = int(w[:-1])
+        elif w.rstrip("s").replace(".", "", 1).isdigit(): seconds = float(w.rstrip("s"))
+    return mode, seconds, requests
+
+_profile_tasks = set()
+
+async def send_profile(message: types.Message, session):
+    await session.done.wait()
+    report = session.report
+    for path in report.files.values():
+        with open(path, "rb") as f: data = f.read()
+        await message.answer_document(types.BufferedInputFile(data, os.path.basename(path)))
+    await message.answer(f"<b>{html.escape(report.title())}</b>\n<pre>{html.escape(report.summary[:3500])}</pre>", parse_mode=ParseMode.HTML)
+
+@router.message(Command("profile"))
+async def cmd_profile(message: types.Message):
+    if not ADMIN_ID or message.from_user.id != ADMIN_ID:
+        await message.answer("Недостаточно прав.")
+        return
+    mode, seconds, requests = parse_profile_args(message.text)
+    try:
+        session = PROFILER.start(mode, seconds, requests)
+    except RuntimeError:
+        await message.answer("Профилирование уже идёт."); return
+    limit = f"{session.seconds:g} с" + (f" или {requests} запросов" if requests else "")
+    await message.answer(f"Профилирую ({mode}): {limit}. Отчёт пришлю сюда.")
+    # the report is sent from a task so this chat's webhook worker is not held for the whole capture
+    task = asyncio.create_task(send_profile(message, session))
+    _profile_tasks.add(task); task.add_done_callback(_profile_tasks.discard)
+
+@router.message(Command("find"))
 async def cmd_find(message: types.Message):
     parts = message.text.split(" ", 1)
     if len(parts) < 2 or not parts[1].strip():
         await message.answer("Использование: <code>/find ваш_запрос</code>", parse_mode=ParseMode.HTML)
         return
-    items = search_items(DATA, parts[1], 30)
+    st = STATE; query = parts[1]
+    mode = "exact"; start = -1
+    items, nxt = find_page(st, mode, query, start)
+    if not items:
+        mode = "fuzzy"; start = 0
+        items, nxt = find_page(st, mode, query, start)
     if not items:
         await message.answer("Ничего не нашёл.")
         return
-    lines = []
-    for r in items[:20]:
-        uni = r.get("university") or "-"
-        city = r.get("city") or "-"
-        src = r.get("rating_source") or ""
-        year = r.get("rating_year") or ""
-        pos = r.get("rating_position")
-        rating = f" | {src} {year} #{pos}" if src and year and pos else ""
-        lines.append(f"• <b>{uni}</b> — {city}{rating}")
-    await message.answer("\n".join(lines), parse_mode=ParseMode.HTML)
-
-@router.message(commands={"topdifficulty"})
+    markup = page_keyboard(PAGES.open(mode, query, st.version, start, nxt), 0, True) if nxt is not None else None
+    await message.answer(format_find(items, st.fragments), parse_mode=ParseMode.HTML, reply_markup=markup)
+
+@router.callback_query(F.data.startswith("pg:"))
+async def cb_find_page(callback: types.CallbackQuery):
+    parts = (callback.data or "").split(":")
+    if len(parts) != 3 or not parts[2].isdigit():
+        await callback.answer(); return  # not a button this bot made
+    token, page = parts[1], int(parts[2])
+    session = PAGES.get(token); st = STATE
+    if session is None or session["version"] != st.version or not 0 <= page < len(session["starts"]) or callback.message is None:
+        await callback.answer("Результаты устарели, повторите /find.", show_alert=True)
+        return
+    filters = session.get("filters")
+    items, nxt = find_page(st, session["mode"], session["query"], session["starts"][page], FacetFilter(*filters) if filters else None)
+    if nxt is not None and len(session["starts"]) == page+1:
+        session["starts"].append(nxt); PAGES.save(token, session)
+    await callback.message.edit_text(format_find(items, st.fragments) or "Ничего не нашёл.", parse_mode=ParseMode.HTML,
+                                     reply_markup=page_keyboard(token, page, nxt is not None))
+    await callback.answer()
+
+def parse_top_filters(text):
+    source = year = None; rest = []
+    sources = STATE.boards.sources()
+    for w in (text or "").split()[1:]:
+        if len(w) == 4 and w.isdigit() and year is None:
+            year = int(w); continue
+        match = [s for s in sources if s.lower().startswith(w.lower())]
+        if match and source is None:
+            source = match[0]; continue
+        rest.append(w)
+    return source, year, " ".join(rest) or None
+
+_RANGE = re.compile(r"^(\d+(?:[.,]\d+)?)[-–](\d+(?:[.,]\d+)?)$")
+_BOUND = re.compile(r"^([<>]=?)(\d+(?:[.,]\d+)?)$")
+
+def parse_difficulty(w):
+    """`70-100`, `>70`, `>=70`, `<50`, `<=50` -> inclusive (min, max); None when w is not a range."""
+    m = _RANGE.match(w)
+    if m: return float(m[1].replace(",", ".")), float(m[2].replace(",", "."))
+    m = _BOUND.match(w)
+    if not m: return None
+    v = float(m[2].replace(",", "."))
+    if m[1] == ">": return math.nextafter(v, math.inf), None
+    if m[1] == ">=": return v, None
+    if m[1] == "<": return None, math.nextafter(v, -math.inf)
+    return None, v
+
+def parse_filter_args(text, st):
+    """`/filter Москва RAEX 2024 >70 технический` -> (FacetFilter, "технический").
+
+    Year, source and difficulty range are recognised like in /topdifficulty; the longest run of words
+    naming a known city becomes the city filter, and whatever is left is searched as text."""
+    source = year = None; dmin = dmax = None; rest = []
+    sources = st.boards.sources()
+    for w in (text or "").split()[1:]:
+        if len(w) == 4 and w.isdigit() and year is None:
+            year = int(w); continue
+        rng = parse_difficulty(w)
+        if rng is not None and dmin is None and dmax is None:
+            dmin, dmax = rng; continue
+        match = [s for s in sources if s.lower().startswith(w.lower())]
+        if match and source is None:
+            source = match[0]; continue
+        rest.append(w)
+    cities = st.facets.city if st.facets is not None else {}
+    city = None
+    for size in range(len(rest), 0, -1):
+        for i in range(len(rest)-size+1):
+            if " ".join(rest[i:i+size]).lower() in cities:
+                city = " ".join(rest[i:i+size]); del rest[i:i+size]; break
+        if city: break
+    return FacetFilter(city, source, year, dmin, dmax), " ".join(rest)
+
+@router.message(Command("filter"))
+async def cmd_filter(message: types.Message):
+    st = STATE
+    flt, query = parse_filter_args(message.text, st)
+    if not flt:
+        await message.answer("Использование: <code>/filter Москва RAEX 2024 &gt;70 [запрос]</code>\n"
+                             "Фильтры: город, источник рейтинга, год, индекс сложности (<code>70-100</code>, <code>&gt;70</code>, <code>&lt;50</code>).",
+                             parse_mode=ParseMode.HTML)
+        return
+    mode = "exact"; start = -1
+    items, nxt = find_page(st, mode, query, start, flt)
+    if not items and query:
+        mode = "fuzzy"; start = 0
+        items, nxt = find_page(st, mode, query, start, flt)
+    if not items:
+        await message.answer("По этим фильтрам ничего нет.")
+        return
+    markup = page_keyboard(PAGES.open(mode, query, st.version, start, nxt, flt.key()), 0, True) if nxt is not None else None
+    await message.answer(format_find(items, st.fragments), parse_mode=ParseMode.HTML, reply_markup=markup)
+
+@router.message(Command("topdifficulty"))
 async def cmd_topdifficulty(message: types.Message):
-    items = top_by_difficulty(DATA, 20)
+    st = STATE
+    source, year, city = parse_top_filters(message.text)
+    items = top_by_difficulty(st.data, TOP_PAGE, st.boards, source, year, city)
     if not items:
+        if source or year or city:
+            await message.answer("По этим фильтрам ничего нет."); return
         await message.answer("Пока нет данных рейтингов."); return
-    lines=[]
-    for i, r in enumerate(items, 1):
-        uni = r.get("university") or "-"
-        city = r.get("city") or "-"
-        src = r.get("rating_source") or ""
-        year = r.get("rating_year") or ""
-        pos = r.get("rating_position")
-        diff = r.get("difficulty_index")
-        rt = f"{src} {year} #{pos}" if src and year and pos else ""
-        lines.append(f"{i}. <b>{uni}</b> — {city} | {rt} | idx: {diff}")
-    await message.answer("\n".join(lines), parse_mode=ParseMode.HTML)
+    await message.answer(format_top(items, st.fragments), parse_mode=ParseMode.HTML)
+
+@router.inline_query()
+async def inline_suggest(query: types.InlineQuery):
+    st = STATE
+    offset = int(query.offset) if query.offset.isdigit() else 0
+    items = suggest_items(st.data, query.query, INLINE_MAX, st.prefix, RESULTS, st.version)
+    page = items[offset:offset+INLINE_PAGE]
+    end = offset + len(page)
+    await query.answer([inline_result(offset+n, r) for n, r in enumerate(page)], cache_time=INLINE_CACHE_TIME,
+                       next_offset=str(end) if end < len(items) else "")
 
 @router.message()
 async def any_text(message: types.Message):
-    items = search_items(DATA, message.text, 10)
+    st = STATE
+    items = search_ranked(st.data, message.text, 10, st.fuzzy, RESULTS, st.version)
     if not items:
         await message.answer("Не нашёл. Попробуй иначе или /find.")
         return
-    top = items[0]
-    uni = top.get("university") or "-"
-    city = top.get("city") or "-"
-    src = top.get("rating_source") or ""
-    year = top.get("rating_year") or ""
-    pos = top.get("rating_position")
-    rating = f" | {src} {year} #{pos}" if src and year and pos else ""
-    await message.answer(f"Нашёл: <b>{uni}</b> — {city}{rating}\nСовпадений: {len(items)}", parse_mode=ParseMode.HTML)
+    await message.answer(format_hit(items), parse_mode=ParseMode.HTML)
@@ -1,28 +1,45 @@
-
-import os, hashlib, json
-from typing import List, Dict, Any, Optional
-from datetime import datetime
-import orjson, httpx
-from cachetools import TTLCache
+import os, hashlib, hmac, asyncio, time
+from typing import Dict, Optional
+from datetime import datetime, timezone
 from fastapi import FastAPI, Request, Header, HTTPException
-from fastapi.responses import JSONResponse, PlainTextResponse
+from fastapi.responses import PlainTextResponse, Response, FileResponse
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.types import Update
 from aiogram.enums import ParseMode
-from services.search import search_items
+from services.search import search_page, ranked_page, facet_selection, encode_cursor, decode_cursor
+from services.facets import FacetFilter
+from services.state import State, build_state
+from services.refresher import Refresher
+from services.cache import RESULTS, PAGES
+from services.loader import download, data_format, read_dataset, close_client
+from services.updates import UpdateQueue, SpoolQueue
+from services.snapshot import load_snapshot
+from services.metrics import REGISTRY, SharedMetrics, CONTENT_TYPE, FIND_SECONDS, WEBHOOK_SECONDS, LOAD_SECONDS
+from services.profiler import PROFILER
+from services.render import json_page
+from services.shared import SharedDataset
 from handlers.basic import router as basic_router, set_data_ref, set_force_reload_ref
 
 TELEGRAM_TOKEN=os.getenv("TELEGRAM_TOKEN","")
 BASE_URL=os.getenv("PUBLIC_BASE_URL","").rstrip("/")
 DATA_JSON_PATH=os.getenv("DATA_JSON_PATH","public/data/sample.json")
+DATA_SNAPSHOT_PATH=os.getenv("DATA_SNAPSHOT_PATH","")
 DATA_REFRESH_TTL=int(os.getenv("DATA_REFRESH_TTL_SECONDS","300") or "300")
 LOG_LEVEL=os.getenv("LOG_LEVEL","info").lower()
 GITHUB_DATA_REPO=os.getenv("GITHUB_DATA_REPO","")
 GITHUB_DATA_PATH=os.getenv("GITHUB_DATA_PATH","")
 GITHUB_DATA_BRANCH=os.getenv("GITHUB_DATA_BRANCH","main")
+GITHUB_SNAPSHOT_PATH=os.getenv("GITHUB_SNAPSHOT_PATH","")
 PORT=int(os.getenv("PORT","8000"))
 WEBHOOK_SECRET=os.getenv("WEBHOOK_SECRET")
+WEBHOOK_MODE=os.getenv("WEBHOOK_MODE","queue").lower()
+WEBHOOK_WORKERS=int(os.getenv("WEBHOOK_WORKERS","4") or "4")
+WEBHOOK_QUEUE_SIZE=int(os.getenv("WEBHOOK_QUEUE_SIZE","1000") or "1000")
+ADMIN_TOKEN=os.getenv("ADMIN_TOKEN","")
+WEB_CONCURRENCY=int(os.getenv("WEB_CONCURRENCY","1") or "1")
+SHARED_DATA_DIR=os.getenv("SHARED_DATA_DIR","") or (".cache/shared" if WEB_CONCURRENCY>1 else "")
+SHARED_POLL_SECONDS=float(os.getenv("SHARED_POLL_SECONDS","2") or "2")
 if not TELEGRAM_TOKEN: raise RuntimeError("TELEGRAM_TOKEN is required")
 if not WEBHOOK_SECRET: WEBHOOK_SECRET=hashlib.sha256(TELEGRAM_TOKEN.encode()).hexdigest()[:24]
 WEBHOOK_URL=f"{BASE_URL}/webhook/{WEBHOOK_SECRET}" if BASE_URL else None
@@ -31,88 +48,213 @@ app=FastAPI()
 bot=Bot(token=TELEGRAM_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
 dp=Dispatcher(); dp.include_router(basic_router)
 
-DATA: List[Dict[str,Any]]=[]; DATA_LAST=None
-cache=TTLCache(maxsize=2048, ttl=300)
-_GH_ETAG=None; _GH_LAST=None
+STATE=State()
+SHARED=SharedDataset(SHARED_DATA_DIR) if SHARED_DATA_DIR else None
+if SHARED is not None:
+    PAGES.share(os.path.join(SHARED_DATA_DIR, "pages"))  # a "Далее →" press may reach another worker
+METRICS=SharedMetrics(os.path.join(SHARED_DATA_DIR, "metrics"), REGISTRY) if SHARED is not None else None  # a scrape reaches one worker
+_shared_task: Optional[asyncio.Task]=None
+_GH_VALIDATORS: Dict[str,Dict[str,str]]={}
 
 def log(level,msg):
     order=["debug","info","warn","error"]
     if order.index(level)>=order.index(LOG_LEVEL): print(f"[{level}] {msg}", flush=True)
 
-def dumps(x): return orjson.dumps(x, option=orjson.OPT_INDENT_2)
+def to_thread(fn, *args):
+    return asyncio.to_thread(PROFILER.threaded(fn), *args)
 
-async def fetch(url, headers=None):
-    async with httpx.AsyncClient(timeout=30.0) as c:
-        r=await c.get(url, headers=headers or {}); s=r.status_code
-        if s not in (200,304): r.raise_for_status()
-        return (r.text if s==200 else ""), dict(r.headers), s
+def raw_url(path=None):
+    path=path or GITHUB_DATA_PATH
+    if not (GITHUB_DATA_REPO and path): return None
+    return f"https://raw.githubusercontent.com/{GITHUB_DATA_REPO}/{GITHUB_DATA_BRANCH}/{path}"
 
-def raw_url():
-    if not (GITHUB_DATA_REPO and GITHUB_DATA_PATH): return None
-    return f"https://raw.githubusercontent.com/{GITHUB_DATA_REPO}/{GITHUB_DATA_BRANCH}/{GITHUB_DATA_PATH}"
+async def fetch_github(url, parse):
+    # validators are only remembered once the body parsed, so a bad file is not answered with 304 forever
+    v=_GH_VALIDATORS.get(url,{}); h={}
+    if v.get("etag"): h["If-None-Match"]=v["etag"]
+    if v.get("last-modified"): h["If-Modified-Since"]=v["last-modified"]
+    path, hdrs, status = await download(url, h)
+    if status==304: return "__NOCHANGE__"
+    try: result=await to_thread(parse, path)
+    finally: os.unlink(path)  # a mapped snapshot stays readable after unlink
+    _GH_VALIDATORS[url]={k:hdrs[k] for k in ("etag","last-modified") if hdrs.get(k)}
+    return result
 
 async def load_from_github():
+    if GITHUB_SNAPSHOT_PATH and raw_url(GITHUB_SNAPSHOT_PATH):
+        try: return await fetch_github(raw_url(GITHUB_SNAPSHOT_PATH), lambda p: load_snapshot(p, STATE))
+        except Exception as e: log("warn", f"GitHub snapshot failed, falling back to {GITHUB_DATA_PATH or 'local data'}: {e}")
     url=raw_url()
     if not url: return None
-    global _GH_ETAG,_GH_LAST
-    h={}
-    if _GH_ETAG: h["If-None-Match"]=_GH_ETAG
-    if _GH_LAST: h["If-Modified-Since"]=_GH_LAST
-    text, hdrs, status = await fetch(url, h)
-    if status==304:
-        log("debug","GitHub dataset not modified (304)."); return "__NOCHANGE__"
-    _GH_ETAG=hdrs.get("ETag") or _GH_ETAG; _GH_LAST=hdrs.get("Last-Modified") or _GH_LAST
-    if GITHUB_DATA_PATH.lower().endswith(".json"):
-        return json.loads(text)
-    elif GITHUB_DATA_PATH.lower().endswith(".csv"):
-        import pandas as pd, io, csv
-        try:
-            reader=csv.DictReader(io.StringIO(text)); return [dict(r) for r in reader]
-        except Exception:
-            df=pd.read_csv(io.StringIO(text)); return df.to_dict(orient="records")
-    else:
-        raise RuntimeError("Unsupported format")
+    return await fetch_github(url, lambda p: read_dataset(p, data_format(GITHUB_DATA_PATH)))
 
 async def load_data():
-    global DATA, DATA_LAST
-    loaded=None; gh=None
+    t=time.perf_counter(); outcome="failed"
+    try:
+        changed=await _load_data(); outcome="changed" if changed else "not_modified"; return changed
+    finally: LOAD_SECONDS.labels(outcome).observe(time.perf_counter()-t)
+
+def install(state):
+    global STATE
+    STATE=state; set_data_ref(state)
+
+async def _load_data():
+    loaded=None; gh=None; state=None
     try: gh=await load_from_github()
     except Exception as e: log("warn", f"load_from_github failed: {e}")
     if gh=="__NOCHANGE__":
-        DATA_LAST=datetime.utcnow(); log("info","Data refresh skipped (GitHub 304)."); return
-    elif isinstance(gh,list): loaded=gh
-    if loaded is None and DATA_JSON_PATH and os.path.exists(DATA_JSON_PATH):
-        loaded=json.loads(open(DATA_JSON_PATH,"rb").read().decode("utf-8"))
-    DATA=loaded or []; DATA_LAST=datetime.utcnow(); set_data_ref(DATA); cache.clear(); log("info", f"Data loaded: {len(DATA)} rows")
+        STATE.loaded_at=datetime.utcnow(); log("info","Data refresh skipped (GitHub 304)."); return False
+    elif isinstance(gh,State): state=gh
+    elif gh is not None: loaded=gh
+    if state is None and loaded is None and DATA_SNAPSHOT_PATH and os.path.exists(DATA_SNAPSHOT_PATH):
+        try: state=await to_thread(load_snapshot, DATA_SNAPSHOT_PATH, STATE)
+        except Exception as e: log("warn", f"snapshot {DATA_SNAPSHOT_PATH} unusable, falling back to JSON: {e}")
+    if state is None:
+        if loaded is None and DATA_JSON_PATH and os.path.exists(DATA_JSON_PATH):
+            fmt="csv" if DATA_JSON_PATH.lower().endswith(".csv") else "json"
+            loaded=await to_thread(read_dataset, DATA_JSON_PATH, fmt)
+        state=await to_thread(build_state, loaded or [], STATE)
+    if SHARED is not None: state=await to_thread(SHARED.publish, state)
+    install(state); log("info", f"Data loaded: {len(state.data)} rows (version {state.version})")
+    return True
+
+refresher=Refresher(load_data, DATA_REFRESH_TTL, on_error=lambda e: log("error", f"load_data failed: {e}"))
+_WEBHOOK_OK=WEBHOOK_SECONDS.labels("processed"); _WEBHOOK_FAILED=WEBHOOK_SECONDS.labels("failed")
+def observe_update(dt, ok):
+    (_WEBHOOK_OK if ok else _WEBHOOK_FAILED).observe(dt)
+    if PROFILER.session is not None: PROFILER.count()
+def _update_error(e): log("error", f"update handling failed: {e}")
+if SHARED_DATA_DIR:
+    # webhook requests land on any worker, so chats are ordered through a spool all workers drain
+    updates=SpoolQueue(os.path.join(SHARED_DATA_DIR, "updates"), lambda u: dp.feed_update(bot, u),
+                       lambda u: u.model_dump_json(by_alias=True, exclude_unset=True).encode(), Update.model_validate_json,
+                       WEBHOOK_WORKERS, WEBHOOK_QUEUE_SIZE, on_error=_update_error, observe=observe_update)
+else:
+    updates=UpdateQueue(lambda u: dp.feed_update(bot, u), WEBHOOK_WORKERS, WEBHOOK_QUEUE_SIZE, on_error=_update_error, observe=observe_update)
 
-async def ensure_fresh():
-    if DATA_REFRESH_TTL<=0: return
-    if DATA_LAST is None or (datetime.utcnow()-DATA_LAST).total_seconds()>DATA_REFRESH_TTL:
-        log("debug","Refreshing data due to TTL..."); await load_data()
+REGISTRY.gauge("unifinder_dataset_rows", "Rows in the served dataset.", fn=lambda: len(STATE.data))
+REGISTRY.gauge("unifinder_dataset_version", "Dataset version, bumped on every load that changed data.", fn=lambda: STATE.version)
+REGISTRY.gauge("unifinder_dataset_loaded_timestamp_seconds", "Unix time of the last successful load or 304 check.",
+               fn=lambda: STATE.loaded_at.replace(tzinfo=timezone.utc).timestamp() if STATE.loaded_at else 0)
+REGISTRY.counter("unifinder_result_cache_requests", "Search result cache lookups.", ["result"],
+                 fn=lambda: {("hit",): RESULTS.hits, ("miss",): RESULTS.misses})
+REGISTRY.gauge("unifinder_result_cache_hit_ratio", "Search result cache hits / lookups since start.", fn=lambda: RESULTS.hit_ratio)
+REGISTRY.counter("unifinder_refresh_triggers", "Refresh triggers: started a load or joined the one in flight.", ["result"],
+                 fn=lambda: {("started",): refresher.loads, ("coalesced",): refresher.coalesced})
+REGISTRY.counter("unifinder_webhook_updates", "Webhook updates by outcome (queue mode).", ["outcome"],
+                 fn=lambda: {("accepted",): updates.accepted, ("dropped",): updates.dropped,
+                             ("processed",): updates.processed, ("failed",): updates.failed})
+REGISTRY.gauge("unifinder_shared_refresher", "1 in the worker that refreshes the shared dataset (or with sharing off).",
+               fn=lambda: 1 if SHARED is None or SHARED.leader else 0)
+REGISTRY.gauge("unifinder_webhook_queue_depth", "Updates waiting in the webhook queue.", fn=lambda: updates.depth())
 
 async def force_reload():
-    await load_data()
+    if SHARED is not None and not SHARED.leader: SHARED.request_refresh(); return
+    await refresher.trigger()
 set_force_reload_ref(force_reload)
 
 @app.get("/healthz")
 async def healthz(): return PlainTextResponse("ok")
 
+@app.get("/stats")
+async def stats():
+    st=STATE
+    return {"rows":len(st.data),"version":st.version,"loaded_at":st.loaded_at.isoformat() if st.loaded_at else None,
+            "refresher":{"loads":refresher.loads,"coalesced":refresher.coalesced},"cache":RESULTS.stats(),
+            "webhook":{"mode":WEBHOOK_MODE, **updates.stats()},"shared":SHARED.stats() if SHARED else None}
+
+@app.get("/metrics")
+async def metrics(): return Response(METRICS.render() if METRICS is not None else REGISTRY.render(), media_type=CONTENT_TYPE)
+
+_FIND_EXACT=FIND_SECONDS.labels("exact"); _FIND_FUZZY=FIND_SECONDS.labels("fuzzy")
+
 @app.get("/find")
-async def http_find(q: str, limit: int=10):
-    await ensure_fresh()
-    items=search_items(DATA, q, limit)
-    return JSONResponse(content=json.loads(dumps({"count":len(items),"items":items})))
+async def http_find(q: str="", limit: int=10, fuzzy: bool=False, offset: int=0, cursor: Optional[str]=None,
+                    city: Optional[str]=None, rating_source: Optional[str]=None, rating_year: Optional[int]=None,
+                    difficulty_min: Optional[float]=None, difficulty_max: Optional[float]=None):
+    t=time.perf_counter(); st=STATE
+    flt=FacetFilter(city, rating_source, rating_year, difficulty_min, difficulty_max)
+    if not q.strip() and not flt: raise HTTPException(status_code=400, detail="q or a filter (city, rating_source, rating_year, difficulty_min, difficulty_max) is required")
+    fuzzy=fuzzy and bool(q.strip())
+    try: pos=decode_cursor(cursor, st.version, 0 if fuzzy else -1) if cursor else None
+    except ValueError as e: raise HTTPException(status_code=400, detail=str(e))
+    sel=facet_selection(st.data, flt, st.facets)
+    if fuzzy: items, nxt=ranked_page(st.data, q, limit, st.fuzzy, RESULTS, st.version, pos if pos is not None else max(0, offset), sel)
+    else: items, nxt=search_page(st.data, q, limit, st.index, RESULTS, st.version, pos if pos is not None else -1, 0 if cursor else max(0, offset), sel)
+    body=json_page(st.fragments, [r.id for r in items], {"next_cursor":encode_cursor(st.version, nxt) if nxt is not None else None})
+    resp=Response(body, media_type="application/json")
+    (_FIND_FUZZY if fuzzy else _FIND_EXACT).observe(time.perf_counter()-t)
+    if PROFILER.session is not None: PROFILER.count()
+    return resp
+
+@app.get("/admin/profile")
+async def admin_profile(mode: str="cprofile", seconds: float=0, requests: int=0, format: str="",
+                        x_admin_token: Optional[str]=Header(None)):
+    """Profiles the next `requests` requests or `seconds` seconds and returns the report file."""
+    if not ADMIN_TOKEN: raise HTTPException(status_code=404, detail="not found")
+    if not hmac.compare_digest(x_admin_token or "", ADMIN_TOKEN): raise HTTPException(status_code=403, detail="forbidden")
+    try: report=await PROFILER.capture(mode, seconds or None, requests)
+    except ValueError as e: raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e: raise HTTPException(status_code=409, detail=str(e))
+    path=report.files.get(format) or next(iter(report.files.values()))
+    return FileResponse(path, filename=os.path.basename(path), headers={"X-Profile": report.title()})
 
 @app.post(f"/webhook/{{secret}}")
 async def webhook(secret: str, request: Request, x_telegram_bot_api_secret_token: Optional[str]=Header(None)):
+    t=time.perf_counter()
     if secret!=WEBHOOK_SECRET: raise HTTPException(status_code=403, detail="forbidden")
-    body=await request.json(); update=Update.model_validate(body); await dp.feed_update(bot, update); return {"ok":True}
+    try: update=Update.model_validate(await request.json())
+    except Exception: raise HTTPException(status_code=400, detail="bad update")
+    if WEBHOOK_MODE!="queue":
+        ok=False
+        try: await dp.feed_update(bot, update); ok=True
+        finally: observe_update(time.perf_counter()-t, ok)
+        return {"ok":True}
+    if not await updates.submit(update, t):
+        log("warn", f"webhook queue full, dropped update {update.update_id}")
+    return {"ok":True}
+
+async def become_refresher():
+    log("info", f"worker {os.getpid()} is the dataset refresher for {SHARED.root}")
+    await refresher.trigger(); refresher.start()
+
+async def watch_shared():
+    # followers switch to every snapshot the refresher publishes, and take over its lock if it exits;
+    # every worker also leaves its metrics for whichever worker the next scrape reaches
+    while True:
+        await asyncio.sleep(SHARED_POLL_SECONDS)
+        try:
+            METRICS.flush()
+            if not SHARED.leader and SHARED.try_lead(): await become_refresher()
+            if SHARED.leader and SHARED.refresh_requested(): refresher.trigger()
+            ptr=SHARED.changed()
+            if ptr is not None:
+                install(await asyncio.to_thread(SHARED.attach, ptr, STATE)); log("info", f"Attached shared dataset version {STATE.version}")
+        except Exception as e: log("error", f"shared dataset watch failed: {e}")
 
 @app.on_event("startup")
 async def on_startup():
-    log("info","Starting bot..."); await load_data()
-    if WEBHOOK_URL: await bot.set_webhook(url=WEBHOOK_URL); log("info", f"Webhook set: {WEBHOOK_URL}")
+    global _shared_task
+    log("info","Starting bot...")
+    if SHARED is None:
+        await refresher.trigger(); refresher.start()
+    else:
+        ptr=SHARED.pointer()
+        if ptr:
+            try: install(await asyncio.to_thread(SHARED.attach, ptr, STATE))
+            except Exception as e: log("warn", f"shared snapshot {ptr.get('file')} unusable: {e}")
+        if SHARED.try_lead(): await become_refresher()
+        _shared_task=asyncio.create_task(watch_shared())
+    if WEBHOOK_MODE=="queue": updates.start()
+    # one worker is enough to register the webhook
+    if WEBHOOK_URL and (SHARED is None or SHARED.leader): await bot.set_webhook(url=WEBHOOK_URL); log("info", f"Webhook set: {WEBHOOK_URL}")
     log("info","Bot is ready.")
 
+@app.on_event("shutdown")
+async def on_shutdown():
+    if _shared_task is not None: _shared_task.cancel()
+    if METRICS is not None: METRICS.close()
+    await updates.stop(); await refresher.stop(); await close_client()
+
 if __name__=="__main__":
-    import uvicorn; uvicorn.run("main:app", host="0.0.0.0", port=int(os.getenv("PORT","8000")), reload=False)
+    import uvicorn; uvicorn.run("main:app", host="0.0.0.0", port=int(os.getenv("PORT","8000")), reload=False, workers=WEB_CONCURRENCY)
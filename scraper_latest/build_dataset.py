@@ -1,11 +1,15 @@
 #!/usr/bin/env python3
-import os, json, re
+import os, json
 from typing import List, Dict, Any
 import pandas as pd
 
 from scraper_latest.providers.raex import parse as raex_parse
 from scraper_latest.providers.interfax import parse as interfax_parse
 from scraper_latest.providers.all_unis import fetch_all_unis
+from scraper_latest.providers.runner import run_providers
+from scraper_latest.linkage import NameIndex, link
+from services.state import build_state
+from services.snapshot import write_snapshot
 
 ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 OUT_DIR = os.path.join(ROOT, "public", "data")
@@ -13,37 +17,34 @@ os.makedirs(OUT_DIR, exist_ok=True)
 
 DEFAULT_UNI_URL = "https://opendata.obrnadzor.gov.ru/opendata/7701537808-raoo/data-20240501T0000.csv"
 
-def norm_name(s: str) -> str:
-    if not s: return ""
-    s = str(s)
-    s = re.sub(r"\s+", " ", s, flags=re.M).strip().lower()
-    s = s.replace("«","").replace("»","").replace('\"',"").replace("\'","").replace('"',"").replace("'","")
-    repl = {
-        "федеральное государственное бюджетное образовательное учреждение высшего образования ": "",
-        "национальный исследовательский ": "",
-        "федеральный ": "",
-        "университет имени": "университет им",
-        "имени ": "им ",
-        "российский ": "",
-        "государственный ": "",
-    }
-    for k,v in repl.items(): s = s.replace(k,v)
-    return s
-
 def compute_difficulty_index(df: pd.DataFrame) -> pd.DataFrame:
+    """Percentile of rating_position within each (source, year), as 0..100 with 100 for the top."""
     if "rating_position" not in df or df["rating_position"].isna().all():
         df["difficulty_index"] = pd.NA
         return df
-    def per_group(g: pd.DataFrame) -> pd.DataFrame:
-        g = g.copy().sort_values("rating_position")
-        n = len(g)
-        if n <= 1:
-            g["difficulty_index"] = 100
-            return g
-        g["rank_percentile"] = (g["rating_position"].rank(method="min") - 1) / (n - 1)
-        g["difficulty_index"] = ((1 - g["rank_percentile"]) * 100).round(0).astype("Int64")
-        return g
-    return df.groupby(["rating_source","rating_year"], group_keys=False).apply(per_group)
+    keys = ["rating_source","rating_year"]
+    df = df.dropna(subset=keys).sort_values(keys + ["rating_position"], kind="stable")
+    g = df.groupby(keys, sort=False)["rating_position"]
+    n = g.transform("size")
+    pct = ((g.rank(method="min") - 1) / (n - 1)).where(n > 1)
+    di = ((1 - pct) * 100).round(0).astype("Int64").mask(n <= 1, 100)
+    return df.assign(rank_percentile=pct, difficulty_index=di)
+
+RATING_COLUMNS = ["rating_source","rating_year","rating_position","difficulty_index","match_confidence"]
+
+def link_ratings(base: pd.DataFrame, ratings: pd.DataFrame) -> pd.DataFrame:
+    """Left join of ratings onto base through fuzzy name linkage, one base row per rating table entry."""
+    index = NameIndex(base["university"].tolist(), base["city"].tolist())
+    hits = []
+    for _, g in ratings.groupby(["rating_source","rating_year"], sort=False):
+        cities = g["city"].fillna("").astype(str).tolist() if "city" in g else None
+        m = link(index, g["university"].fillna("").astype(str).tolist(), cities)
+        for q, (i, conf) in m.items(): hits.append((g.index[q], i, conf))
+    print(f"[INFO] Linked {len(hits)} of {len(ratings)} rating rows to the base list")
+    if not hits: return base.assign(**{c: pd.NA for c in RATING_COLUMNS})
+    r_idx, b_idx, conf = zip(*hits)
+    linked = ratings.loc[list(r_idx), RATING_COLUMNS[:-1]].assign(match_confidence=list(conf), _base=list(b_idx))
+    return base.merge(linked, left_index=True, right_on="_base", how="left").drop(columns=["_base"]).reset_index(drop=True)
 
 def main():
     url = os.getenv("ALL_UNI_CSV_URL", DEFAULT_UNI_URL).strip()
@@ -53,45 +54,32 @@ def main():
     base = pd.DataFrame(base_rows)
     base["university"] = base["university"].fillna("").astype(str)
     base["city"] = base.get("city", pd.Series([""]*len(base))).fillna("").astype(str)
-    base["norm_name"] = base["university"].map(norm_name)
+    base = base.drop(columns=[c for c in RATING_COLUMNS if c in base.columns])
 
-    rating_rows: List[Dict[str,Any]] = []
-    try:
-        rating_rows.extend(raex_parse())
-    except Exception as e:
-        print(f"[WARN] RAEX parse failed: {e}")
+    providers = {"RAEX": lambda docs: raex_parse(docs=docs)}
     for y in (2025, 2024):
-        try:
-            rows = interfax_parse(year=y)
-            for r in rows: r["rating_year"] = y
-            rating_rows.extend(rows)
-        except Exception as e:
-            print(f"[WARN] Interfax parse failed ({y}): {e}")
+        providers[f"Interfax ({y})"] = lambda docs, y=y: interfax_parse(year=y, docs=docs)
+    results, _ = run_providers(providers)
+    rating_rows: List[Dict[str,Any]] = [r for rows in results.values() for r in rows]
     ratings = pd.DataFrame(rating_rows)
     if not ratings.empty:
-        ratings["norm_name"] = ratings["university"].map(norm_name)
         ratings = compute_difficulty_index(ratings)
-
-    if not ratings.empty:
-        merged = base.merge(
-            ratings[["norm_name","rating_source","rating_year","rating_position","difficulty_index"]],
-            on="norm_name",
-            how="left"
-        )
+        merged = link_ratings(base, ratings)
     else:
         merged = base.copy()
 
-    if "norm_name" in merged.columns:
-        merged = merged.drop(columns=["norm_name"])
-
     out_dir = OUT_DIR
     os.makedirs(out_dir, exist_ok=True)
     out_csv  = os.path.join(out_dir, "latest.csv")
     out_json = os.path.join(out_dir, "latest.json")
+    out_snap = os.path.join(out_dir, "latest.snap")
+    # missing values as None: json.dump would write NaN, and NaN strings break sorting in the bot
+    records = merged.astype(object).where(merged.notna(), None).to_dict(orient="records")
     merged.to_csv(out_csv, index=False)
     with open(out_json,"w",encoding="utf-8") as f:
-        json.dump(merged.to_dict(orient="records"), f, ensure_ascii=False, indent=2)
-    print(f"[OK] Wrote {out_csv} and {out_json} with {len(merged)} rows.")
+        json.dump(records, f, ensure_ascii=False, indent=2)
+    write_snapshot(out_snap, build_state(records), meta={"source": "build_dataset"})
+    print(f"[OK] Wrote {out_csv}, {out_json} and {out_snap} with {len(merged)} rows.")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,70 @@
+import os, json, time
+from typing import Dict, Any, Iterable, Optional
+
+CHECKPOINT_DIR = os.getenv("SCRAPER_CHECKPOINT_DIR", os.path.join(".cache", "checkpoints"))
+# older records are treated as stale and redone, so a nightly run starts fresh while a restart resumes
+CHECKPOINT_MAX_AGE = int(os.getenv("SCRAPER_CHECKPOINT_MAX_AGE_SECONDS", str(20*3600)) or str(20*3600))
+
+class Checkpoint:
+    """Append-only JSONL log of one stage's results; the last record per key wins.
+
+    Every record is flushed as soon as it is written, and a torn last line (crash mid-write) is ignored on load.
+    """
+    def __init__(self, path: str, max_age: Optional[float]=CHECKPOINT_MAX_AGE, fresh: bool=False):
+        self.path = path; self.max_age = max_age
+        self.records: Dict[str, Dict[str, Any]] = {}
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if not fresh and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try: rec = json.loads(line)
+                    except ValueError: continue
+                    if isinstance(rec, dict) and "key" in rec: self.records[rec["key"]] = rec
+        self._fp = open(path, "w" if fresh else "a", encoding="utf-8")
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.records
+
+    def keys(self) -> Iterable[str]:
+        return self.records.keys()
+
+    def done(self, key: str) -> bool:
+        rec = self.records.get(key)
+        if rec is None or not rec.get("ok"): return False
+        return self.max_age is None or time.time() - rec.get("ts", 0) < self.max_age
+
+    def value(self, key: str) -> Any:
+        """Data of the last successful record for key, stale or not."""
+        rec = self.records.get(key)
+        return rec.get("data") if rec else None
+
+    def record(self, key: str, data: Any, ok: bool=True):
+        rec = {"key": key, "ok": ok, "ts": time.time(), "data": data}
+        if not ok and key in self.records:
+            rec["data"] = self.records[key].get("data")  # keep the last good value around for assembling output
+        self.records[key] = rec
+        self._fp.write(json.dumps(rec, ensure_ascii=False) + "\n"); self._fp.flush()
+
+    def stats(self) -> Dict[str, int]:
+        ok = sum(1 for k in self.records if self.done(k))
+        return {"records": len(self.records), "done": ok, "pending": len(self.records) - ok}
+
+    def compact(self):
+        """Rewrites the log with only the last record per key."""
+        self._fp.close(); tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for rec in self.records.values(): f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        os.replace(tmp, self.path)
+        self._fp = open(self.path, "a", encoding="utf-8")
+
+    def close(self):
+        self._fp.close()
+
+def open_stages(stages: Iterable[str], run: Iterable[str]=(), resume: bool=True, root: str=CHECKPOINT_DIR,
+                max_age: Optional[float]=CHECKPOINT_MAX_AGE) -> Dict[str, Checkpoint]:
+    """One Checkpoint per stage under root; stages in `run` start empty unless resuming."""
+    run = set(run)
+    return {s: Checkpoint(os.path.join(root, s + ".jsonl"), max_age, fresh=(s in run and not resume)) for s in stages}
@@ -0,0 +1,122 @@
+import asyncio, json, random, time
+from typing import Dict, Any, Optional
+from urllib.parse import urlsplit
+import httpx
+
+from scraper_latest.http_cache import HttpCache
+
+HEADERS = {"User-Agent": "Mozilla/5.0 (compatible; UniFinder/1.0; +https://github.com/German8002/uni-finder-bot)",
+           "Accept-Language": "ru,en;q=0.9"}
+# requests per second allowed per host; anything else gets DEFAULT_RATE
+HOST_RATES = {"www.edu.ru": 2.0, "ru.wikipedia.org": 5.0, "raex-rr.com": 1.0, "academia.interfax.ru": 1.0}
+DEFAULT_RATE = 1.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+def log(msg): print(f"[crawler] {msg}", flush=True)
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float=1.0):
+        self.rate = rate; self.capacity = max(1.0, burst)
+        self.tokens = self.capacity; self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated)*self.rate); self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1; return
+                await asyncio.sleep((1 - self.tokens)/self.rate)
+
+class Crawler:
+    """Pooled async HTTP client with per-host token buckets, bounded concurrency and jittered retries.
+
+    Pass `transport` (e.g. httpx.MockTransport or an ASGI transport) to run against a local stand-in,
+    and `cache` to serve fetch()/fetch_json() from an HttpCache with conditional revalidation.
+    """
+    def __init__(self, concurrency: int=8, retries: int=3, backoff: float=1.0, timeout: float=30.0,
+                 host_rates: Optional[Dict[str, float]]=None, default_rate: float=DEFAULT_RATE, burst: float=2.0,
+                 headers: Optional[Dict[str, str]]=None, transport: Optional[httpx.AsyncBaseTransport]=None,
+                 cache: Optional[HttpCache]=None):
+        self.cache = cache; self.retries = retries; self.backoff = backoff; self.burst = burst
+        self.host_rates = dict(HOST_RATES if host_rates is None else host_rates); self.default_rate = default_rate
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._sem = asyncio.Semaphore(concurrency)
+        self.client = httpx.AsyncClient(headers=headers or HEADERS, timeout=timeout, follow_redirects=True, transport=transport,
+                                        limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency))
+        self.requests = 0; self.retried = 0; self.failed = 0
+
+    async def __aenter__(self) -> "Crawler":
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        await self.client.aclose()
+
+    def bucket(self, url: str) -> TokenBucket:
+        host = urlsplit(url).hostname or ""
+        b = self._buckets.get(host)
+        if b is None:
+            b = self._buckets[host] = TokenBucket(self.host_rates.get(host, self.default_rate), self.burst)
+        return b
+
+    def _delay(self, attempt: int, resp: Optional[httpx.Response]=None) -> float:
+        ra = resp.headers.get("retry-after") if resp is not None else None
+        if ra and ra.isdigit(): return float(ra)
+        return self.backoff * 2**attempt * random.uniform(0.5, 1.5)
+
+    async def get(self, url: str, params: Optional[Dict[str, Any]]=None, headers: Optional[Dict[str, str]]=None) -> Optional[httpx.Response]:
+        """Response for url, or None once every retry failed (the failure is logged, not raised)."""
+        for attempt in range(self.retries):
+            await self.bucket(url).acquire()
+            resp = None
+            try:
+                async with self._sem:
+                    self.requests += 1
+                    resp = await self.client.get(url, params=params, headers=headers)
+                if resp.status_code not in RETRY_STATUSES:
+                    if resp.status_code != 304: resp.raise_for_status()
+                    return resp
+                err = f"HTTP {resp.status_code}"
+            except httpx.HTTPStatusError as e:
+                self.failed += 1; log(f"WARN fetch failed: {url} :: {e}"); return None
+            except httpx.HTTPError as e:
+                err = repr(e)
+            if attempt == self.retries - 1:
+                self.failed += 1; log(f"WARN fetch failed: {url} :: {err}"); return None
+            self.retried += 1
+            await asyncio.sleep(self._delay(attempt, resp))
+        return None
+
+    async def fetch(self, url: str, params: Optional[Dict[str, Any]]=None) -> Optional[str]:
+        if self.cache is None:
+            resp = await self.get(url, params)
+            return resp.text if resp is not None else None
+        c = self.cache; full = str(httpx.URL(url, params=params)) if params else url
+        e = c.lookup(full)
+        if e is not None and (c.offline or c.is_fresh(e)):
+            c.hits += 1; return e.text()
+        c.misses += 1
+        if c.offline:
+            log(f"WARN offline miss: {full}"); return None
+        resp = await self.get(full, headers=c.validators(e))
+        if resp is None: return e.text() if e is not None else None  # stale beats nothing
+        if resp.status_code == 304:
+            if e is None: return None
+            c.touch(e); return e.text()
+        c.store(full, resp.content, resp.headers, resp.encoding)
+        return resp.text
+
+    async def fetch_json(self, url: str, params: Optional[Dict[str, Any]]=None) -> Optional[Any]:
+        text = await self.fetch(url, params)
+        if text is None: return None
+        try: return json.loads(text)
+        except ValueError: return None
+
+    def stats(self) -> Dict[str, Any]:
+        s: Dict[str, Any] = {"requests": self.requests, "retried": self.retried, "failed": self.failed}
+        if self.cache is not None: s["cache"] = self.cache.stats()
+        return s
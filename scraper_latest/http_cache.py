@@ -0,0 +1,159 @@
+import os, re, json, time, hashlib
+from typing import Callable, Dict, Any, Iterable, List, Optional, Tuple, Union
+
+CACHE_DIR = os.getenv("SCRAPER_CACHE_DIR", os.path.join(".cache", "http"))
+CACHE_MAX_MB = int(os.getenv("SCRAPER_CACHE_MAX_MB", "512") or "512")
+CACHE_TTL = int(os.getenv("SCRAPER_CACHE_TTL_SECONDS", str(20*3600)) or str(20*3600))
+OFFLINE = os.getenv("SCRAPER_OFFLINE", "").lower() in ("1", "true", "yes")
+CHUNK_SIZE = 1 << 16
+
+# first matching pattern wins; within its TTL an entry is served without asking the server
+TTL_RULES: List[Tuple[str, int]] = [
+    (r"ru\.wikipedia\.org/", 7*24*3600),
+    (r"edu\.ru/vuz/\?", 20*3600),
+    (r"(raex-rr\.com|interfax)", 20*3600),
+]
+
+def log(msg): print(f"[http_cache] {msg}", flush=True)
+
+class Entry:
+    __slots__ = ("key", "meta", "path")
+
+    def __init__(self, key: str, meta: Dict[str, Any], path: str):
+        self.key = key; self.meta = meta; self.path = path
+
+    def body(self) -> bytes:
+        with open(self.path, "rb") as f: return f.read()
+
+    def text(self) -> str:
+        return self.body().decode(self.meta.get("encoding") or "utf-8", errors="replace")
+
+class HttpCache:
+    """On-disk HTTP cache for scraper traffic: bodies plus ETag/Last-Modified, revalidated with conditional GETs.
+
+    With `offline=True` nothing goes to the network and only cached bodies are replayed.
+    """
+    def __init__(self, root: str=CACHE_DIR, default_ttl: int=CACHE_TTL, ttl_rules: Optional[List[Tuple[str, int]]]=None,
+                 max_bytes: int=CACHE_MAX_MB*1024*1024, offline: bool=OFFLINE):
+        self.root = root; self.default_ttl = default_ttl; self.max_bytes = max_bytes; self.offline = offline
+        self.ttl_rules = [(re.compile(p), t) for p, t in (TTL_RULES if ttl_rules is None else ttl_rules)]
+        os.makedirs(root, exist_ok=True)
+        self._size: Optional[int] = None
+        self.hits = 0; self.revalidated = 0; self.misses = 0; self.stored = 0
+
+    def _paths(self, key: str) -> Tuple[str, str]:
+        d = os.path.join(self.root, key[:2])
+        return os.path.join(d, key+".body"), os.path.join(d, key+".json")
+
+    @staticmethod
+    def key(url: str) -> str:
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def ttl(self, url: str) -> int:
+        for rx, ttl in self.ttl_rules:
+            if rx.search(url): return ttl
+        return self.default_ttl
+
+    def lookup(self, url: str) -> Optional[Entry]:
+        key = self.key(url); body, meta = self._paths(key)
+        try:
+            with open(meta, "r", encoding="utf-8") as f: m = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not os.path.exists(body): return None
+        return Entry(key, m, body)
+
+    def is_fresh(self, e: Entry) -> bool:
+        return time.time() - e.meta.get("fetched_at", 0) < self.ttl(e.meta.get("url", ""))
+
+    @staticmethod
+    def validators(e: Optional[Entry]) -> Dict[str, str]:
+        h = {}
+        if e is None: return h
+        if e.meta.get("etag"): h["If-None-Match"] = e.meta["etag"]
+        if e.meta.get("last_modified"): h["If-Modified-Since"] = e.meta["last_modified"]
+        return h
+
+    def _write_meta(self, e: Entry):
+        _, meta = self._paths(e.key); tmp = meta+".tmp"
+        with open(tmp, "w", encoding="utf-8") as f: json.dump(e.meta, f, ensure_ascii=False)
+        os.replace(tmp, meta)
+
+    def touch(self, e: Entry):
+        """Records a successful 304 revalidation; the body mtime is bumped too, since evict() orders by it."""
+        e.meta["fetched_at"] = time.time(); self._write_meta(e); self.revalidated += 1
+        try: os.utime(e.path)
+        except OSError: pass
+
+    def store(self, url: str, body: Union[bytes, Iterable[bytes]], headers, encoding: Optional[str]=None) -> Entry:
+        """Writes the body (bytes, or an iterable of chunks streamed straight to disk) and its validators."""
+        key = self.key(url); path, _ = self._paths(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        old = os.path.getsize(path) if os.path.exists(path) else 0
+        tmp = path+".tmp"
+        try:
+            with open(tmp, "wb") as f:
+                if isinstance(body, (bytes, bytearray)): f.write(body)
+                else:
+                    for chunk in body: f.write(chunk)
+        except BaseException:
+            if os.path.exists(tmp): os.unlink(tmp)
+            raise
+        size = os.path.getsize(tmp)
+        os.replace(tmp, path)
+        e = Entry(key, {"url": url, "etag": headers.get("etag"), "last_modified": headers.get("last-modified"),
+                        "encoding": encoding, "fetched_at": time.time()}, path)
+        self._write_meta(e); self.stored += 1
+        if self._size is not None: self._size += size - old
+        self.evict(keep=path)
+        return e
+
+    def size(self) -> int:
+        if self._size is None:
+            self._size = sum(os.path.getsize(os.path.join(dp, f)) for dp, _, fs in os.walk(self.root) for f in fs if f.endswith(".body"))
+        return self._size
+
+    def evict(self, keep: Optional[str]=None):
+        """Drops least recently fetched bodies (never `keep`) until the cache fits into max_bytes."""
+        if self.size() <= self.max_bytes: return
+        files = []
+        for dp, _, fs in os.walk(self.root):
+            for f in fs:
+                if f.endswith(".body"):
+                    p = os.path.join(dp, f); st = os.stat(p); files.append((st.st_mtime, st.st_size, p))
+        files.sort()
+        for _, sz, p in files:
+            if self._size <= self.max_bytes: break
+            if p == keep: continue
+            for q in (p, p[:-5]+".json"):
+                try: os.unlink(q)
+                except OSError: pass
+            self._size -= sz
+
+    def get_sync(self, url: str, request: Callable[[Dict[str, str]], Any]) -> Optional[Entry]:
+        """Cached GET for blocking clients; `request(extra_headers)` must return a requests-style response.
+
+        The body is copied to disk chunk by chunk, so a response requested with stream=True never sits in memory.
+        """
+        e = self.lookup(url)
+        if e is not None and (self.offline or self.is_fresh(e)):
+            self.hits += 1; return e
+        if self.offline:
+            self.misses += 1; log(f"offline miss: {url}"); return None
+        self.misses += 1
+        r = request(self.validators(e))
+        if r.status_code == 304 and e is not None:
+            self.touch(e); return e
+        r.raise_for_status()
+        return self.store(url, r.iter_content(CHUNK_SIZE), {k.lower(): v for k, v in r.headers.items()}, r.encoding)
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "revalidated": self.revalidated, "misses": self.misses, "stored": self.stored}
+
+_shared: Optional[HttpCache] = None
+
+def shared() -> HttpCache:
+    """Process-wide cache configured from SCRAPER_CACHE_* / SCRAPER_OFFLINE."""
+    global _shared
+    if _shared is None: _shared = HttpCache()
+    return _shared
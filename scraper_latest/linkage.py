@@ -0,0 +1,114 @@
+import re, math
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from services.fuzzy import fold, grams, abbreviations
+
+# legal-form boilerplate that says nothing about which university it is
+STOPWORDS = {"federalnoe", "gosudarstvennoe", "byudzhetnoe", "avtonomnoe", "chastnoe", "obrazovatelnoe", "uchrezhdenie",
+             "vysshego", "obrazovaniya", "professionalnogo", "fgbou", "fgaou", "gbou", "ano", "chou", "vo", "vpo", "im", "imeni", "niu"}
+MIN_CONFIDENCE = 0.6
+MAX_CANDIDATES = 50
+ABBR_SCORE = 0.85
+CITY_BONUS = 0.05
+CITY_PENALTY = 0.1
+
+def norm_name(s: str) -> str:
+    if not s: return ""
+    s = str(s)
+    s = re.sub(r"\s+", " ", s, flags=re.M).strip().lower()
+    s = s.replace("«","").replace("»","").replace('"',"").replace("'","")
+    repl = {
+        "федеральное государственное бюджетное образовательное учреждение высшего образования ": "",
+        "национальный исследовательский ": "",
+        "федеральный ": "",
+        "университет имени": "университет им",
+        "имени ": "им ",
+        "российский ": "",
+        "государственный ": "",
+    }
+    for k,v in repl.items(): s = s.replace(k,v)
+    return s
+
+def name_key(name: str) -> str:
+    return " ".join(t for t in fold(norm_name(name)).split() if len(t) > 1 and t not in STOPWORDS)
+
+class NameIndex:
+    """Blocking index over university names for record linkage.
+
+    Candidates for a query are the rows sharing a rare token or trigram with it, so matching
+    a list against this index never compares all pairs.
+    """
+    def __init__(self, names: Sequence[str], cities: Optional[Sequence[str]]=None):
+        self.keys = [name_key(n) for n in names]
+        self.tokens = [set(k.split()) for k in self.keys]
+        self.grams = [grams(k) for k in self.keys]
+        self.abbrs = [set(abbreviations(n)) for n in names]
+        self.cities = [fold(c or "") for c in cities] if cities is not None else None
+        self.token_postings: Dict[str, List[int]] = {}; self.gram_postings: Dict[str, List[int]] = {}
+        for i in range(len(self.keys)):
+            for t in self.tokens[i] | self.abbrs[i]: self.token_postings.setdefault(t, []).append(i)
+            for g in self.grams[i]: self.gram_postings.setdefault(g, []).append(i)
+        n = len(self.keys)
+        self.idf = {t: math.log((n + 1) / (len(p) + 1)) + 1.0 for t, p in self.token_postings.items()}
+        # postings longer than this are too common to narrow anything down
+        self.max_df = max(50, n // 50)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def candidates(self, key: str, abbrs: Sequence[str]=()) -> List[int]:
+        votes: Counter = Counter()
+        for t in set(key.split()) | set(abbrs):
+            p = self.token_postings.get(t)
+            if p is not None and len(p) <= self.max_df:
+                for i in p: votes[i] += 3
+        for g in grams(key):
+            p = self.gram_postings.get(g)
+            if p is not None and len(p) <= self.max_df: votes.update(p)
+        return [i for i, _ in votes.most_common(MAX_CANDIDATES)]
+
+    def score(self, key: str, toks: set, qgrams: set, abbrs: set, i: int) -> float:
+        if key == self.keys[i]: return 1.0
+        if (len(toks) == 1 and key in self.abbrs[i]) or self.keys[i] in abbrs: return ABBR_SCORE
+        ct = self.tokens[i] | self.abbrs[i]; idf = self.idf; dflt = math.log(len(self.keys) + 1) + 1.0
+        shared = sum(idf.get(t, dflt) for t in toks & ct)
+        qw = sum(idf.get(t, dflt) for t in toks); cw = sum(idf.get(t, dflt) for t in self.tokens[i])
+        # dice alone punishes short forms of long official names, containment alone any subset
+        tok = shared/(qw + cw) + 0.5*shared/min(qw, cw) if qw and cw else 0.0
+        cg = self.grams[i]
+        gram = 2*len(qgrams & cg)/(len(qgrams) + len(cg)) if qgrams or cg else 0.0
+        return 0.6*tok + 0.4*gram
+
+    def scored(self, name: str, city: Optional[str]=None) -> List[Tuple[int, float]]:
+        """Candidates with confidence, best first; a known city breaks ties and penalises contradictions."""
+        key = name_key(name)
+        if not key: return []
+        toks = set(key.split()); qgrams = grams(key); abbrs = set(abbreviations(name))
+        qc = fold(city or "") if self.cities is not None else ""
+        out = []
+        for i in self.candidates(key, abbrs):
+            s = self.score(key, toks, qgrams, abbrs, i)
+            if qc and self.cities[i]:
+                s = min(1.0, s + CITY_BONUS) if qc == self.cities[i] else s - CITY_PENALTY
+            out.append((i, round(s, 4)))
+        out.sort(key=lambda x: (-x[1], x[0]))
+        return out
+
+    def match(self, name: str, city: Optional[str]=None, min_confidence: float=MIN_CONFIDENCE) -> Optional[Tuple[int, float]]:
+        best = self.scored(name, city)
+        return best[0] if best and best[0][1] >= min_confidence else None
+
+def link(index: NameIndex, names: Sequence[str], cities: Optional[Sequence[str]]=None,
+         min_confidence: float=MIN_CONFIDENCE) -> Dict[int, Tuple[int, float]]:
+    """One-to-one matches {query i: (index row, confidence)}, assigned greedily from the most confident pair."""
+    pairs = []
+    for q, name in enumerate(names):
+        for i, s in index.scored(name, cities[q] if cities is not None else None)[:5]:
+            if s >= min_confidence: pairs.append((s, q, i))
+    pairs.sort(key=lambda p: (-p[0], p[1], p[2]))
+    out: Dict[int, Tuple[int, float]] = {}; used = set()
+    for s, q, i in pairs:
+        if q in out or i in used: continue
+        out[q] = (i, s); used.add(i)
+    return out
@@ -1,47 +1,89 @@
 
-from typing import List, Dict, Any
-import io, os, json, requests
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+import os, csv, requests
 import pandas as pd
 
+from scraper_latest import http_cache
+from services.loader import iter_json_array
+
 HINT = ("Set ALL_UNI_CSV_URL to a direct CSV/JSON URL from obrnadzor.gov.ru or data.gov.ru, "
         "or to a local repo path like 'public/sources/universities.csv'.")
 
 HEADERS = {"User-Agent": "Mozilla/5.0 (compatible; UniFinderBot/1.0)"}
 
-def _read_dataframe_from_text(text: str) -> pd.DataFrame:
-    txt = (text or "").strip()
-    if txt.startswith("{") or txt.startswith("["):
-        try:
-            obj = json.loads(txt)
-            if isinstance(obj, dict) and "items" in obj:
-                obj = obj["items"]
-            if isinstance(obj, list):
-                return pd.DataFrame(obj)
-        except Exception:
-            pass
+# candidate columns in priority order; only these are read from the file
+NAME_COLUMNS = ["university", "name", "full_name", "short_name", "org_name", "OrganizationName", "Наименование", "НаимОрг"]
+CITY_COLUMNS = ["city", "address_city", "region", "location", "Город", "АдресГород"]
+SAMPLE_BYTES = 1 << 16
+CHUNK_ROWS = 50_000
+
+def sniff(path: str) -> Tuple[str, str, Optional[str]]:
+    """(kind, encoding, delimiter) from the first SAMPLE_BYTES of the file; kind is "json" or "csv"."""
+    with open(path, "rb") as f: raw = f.read(SAMPLE_BYTES)
+    encoding = "utf-8-sig"
+    try:
+        raw.decode("utf-8")
+    except UnicodeDecodeError as e:
+        if e.start < len(raw) - 3: encoding = "cp1251"  # a multibyte char cut at the sample end is still utf-8
+    text = raw.decode(encoding, errors="ignore")  # utf-8-sig already drops a BOM
+    if text.lstrip()[:1] in ("{", "["): return "json", encoding, None
+    lines = text.splitlines()
+    sample = "\n".join(lines[:-1] if len(lines) > 1 and len(raw) == SAMPLE_BYTES else lines)
     try:
-        return pd.read_csv(io.StringIO(txt), sep=None, engine="python")
-    except Exception:
-        return pd.read_csv(io.StringIO(txt))
+        delimiter = csv.Sniffer().sniff(sample, delimiters=";,\t|").delimiter
+    except csv.Error:
+        delimiter = ","
+    return "csv", encoding, delimiter
+
+def _first_filled(values: Tuple[str, ...]) -> str:
+    for v in values:
+        v = v.strip()
+        if v: return v
+    return ""
+
+def iter_csv(path: str, encoding: str, delimiter: str, chunk_rows: int=CHUNK_ROWS) -> Iterator[Dict[str, Any]]:
+    """Normalized rows, reading only the candidate columns chunk by chunk with the C parser."""
+    with open(path, "r", encoding=encoding, newline="") as f:
+        header = next(csv.reader(f, delimiter=delimiter), [])
+    header = [h.strip() for h in header]
+    names = [c for c in NAME_COLUMNS if c in header]; cities = [c for c in CITY_COLUMNS if c in header]
+    if not names: return
+    reader = pd.read_csv(path, sep=delimiter, encoding=encoding, engine="c", dtype=str, na_filter=False,
+                         usecols=lambda c: c.strip() in names or c.strip() in cities, chunksize=chunk_rows, on_bad_lines="skip")
+    for chunk in reader:
+        chunk.columns = [c.strip() for c in chunk.columns]
+        n = len(names)
+        for values in zip(*(chunk[c].tolist() for c in names + cities)):
+            u = _first_filled(values[:n])
+            if u: yield {"university": u, "city": _first_filled(values[n:])}
+
+def iter_file(path: str) -> Iterator[Dict[str, Any]]:
+    kind, encoding, delimiter = sniff(path)
+    if kind == "csv":
+        yield from iter_csv(path, encoding, delimiter)
+        return
+    with open(path, "r", encoding=encoding) as f:
+        for r in iter_json_array(f):
+            if isinstance(r, dict):
+                n = normalize_row(r)
+                if n["university"]: yield n
 
-def load_from_url(url: str) -> List[Dict[str, Any]]:
+def resolve(url: str) -> str:
+    """Local path of the source: the file itself, or the HTTP cache body it was streamed into."""
     if not url:
         raise RuntimeError("ALL_UNI_CSV_URL is not set. " + HINT)
     if not url.lower().startswith(("http://", "https://")):
         path = url if os.path.isabs(url) else os.path.join(".", url)
         if not os.path.exists(path):
             raise FileNotFoundError(f"File not found: {path}. " + HINT)
-        with open(path, "r", encoding="utf-8") as f:
-            text = f.read()
-        df = _read_dataframe_from_text(text)
-        return df.to_dict(orient="records")
+        return path
     try:
-        r = requests.get(url, headers=HEADERS, timeout=90)
-        r.raise_for_status()
+        hit = http_cache.shared().get_sync(url, lambda h: requests.get(url, headers={**HEADERS, **h}, timeout=90, stream=True))
     except requests.RequestException as e:
         raise RuntimeError(f"Failed to fetch {url}: {e}. " + HINT)
-    df = _read_dataframe_from_text(r.text)
-    return df.to_dict(orient="records")
+    if hit is None:
+        raise RuntimeError(f"{url} is not cached (SCRAPER_OFFLINE). " + HINT)
+    return hit.path
 
 def normalize_row(row: Dict[str, Any]) -> Dict[str, Any]:
     name = (
@@ -59,10 +101,5 @@ def normalize_row(row: Dict[str, Any]) -> Dict[str, Any]:
     }
 
 def fetch_all_unis(url: str) -> List[Dict[str, Any]]:
-    rows = load_from_url(url)
-    out: List[Dict[str, Any]] = []
-    for r in rows:
-        n = normalize_row(r)
-        if n["university"]:
-            out.append(n)
-    return out
+    """Universities as {"university", "city"} rows; CSV sources are streamed so memory does not grow with file size."""
+    return list(iter_file(resolve(url)))
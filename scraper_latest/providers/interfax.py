@@ -1,16 +1,12 @@
-import time, requests
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from bs4 import BeautifulSoup
 
-INTERFAX_URL = "https://www.interfax-russia.ru/academia/ratings"
-HEADERS = {"User-Agent": "Mozilla/5.0 (compatible; UniFinderBot/1.0)"}
+from scraper_latest.providers.runner import Documents, fetch
 
-def fetch(url: str, delay: float=1.0, timeout: float=30.0) -> str:
-    time.sleep(delay); r = requests.get(url, headers=HEADERS, timeout=timeout); r.raise_for_status(); return r.text
+INTERFAX_URL = "https://www.interfax-russia.ru/academia/ratings"
 
-def parse(year: int=2024) -> List[Dict[str,Any]]:
-    html = fetch(INTERFAX_URL)
-    soup = BeautifulSoup(html, "lxml")
+def parse(year: int=2024, docs: Optional[Documents]=None) -> List[Dict[str,Any]]:
+    soup = docs.soup(INTERFAX_URL) if docs is not None else BeautifulSoup(fetch(INTERFAX_URL), "lxml")
     rows: List[Dict[str,Any]] = []
     for i, a in enumerate(soup.select("a"), 1):
         name = a.get_text(strip=True)
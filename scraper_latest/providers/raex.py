@@ -1,16 +1,13 @@
-import time, re, requests
-from typing import List, Dict, Any
+import re
+from typing import List, Dict, Any, Optional
 from bs4 import BeautifulSoup
 
-RAEX_URL = "https://raex-rr.com/education/russian_universities/top-100_universities/2024/"
-HEADERS = {"User-Agent": "Mozilla/5.0 (compatible; UniFinderBot/1.0)"}
+from scraper_latest.providers.runner import Documents, fetch
 
-def fetch(url: str, delay: float=1.0, timeout: float=30.0) -> str:
-    time.sleep(delay); r = requests.get(url, headers=HEADERS, timeout=timeout); r.raise_for_status(); return r.text
+RAEX_URL = "https://raex-rr.com/education/russian_universities/top-100_universities/2024/"
 
-def parse() -> List[Dict[str,Any]]:
-    html = fetch(RAEX_URL)
-    soup = BeautifulSoup(html, "lxml")
+def parse(docs: Optional[Documents]=None) -> List[Dict[str,Any]]:
+    soup = docs.soup(RAEX_URL) if docs is not None else BeautifulSoup(fetch(RAEX_URL), "lxml")
     rows: List[Dict[str,Any]] = []
     for el in soup.select("tr, .table-row, .rating__row, .raex-rating__row"):
         txt = el.get_text(" ", strip=True)
@@ -0,0 +1,57 @@
+import time, threading, requests
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Any, List, Optional, Tuple
+from bs4 import BeautifulSoup
+
+from scraper_latest import http_cache
+
+HEADERS = {"User-Agent": "Mozilla/5.0 (compatible; UniFinderBot/1.0)"}
+
+Provider = Callable[["Documents"], List[Dict[str, Any]]]
+
+def fetch(url: str, delay: float=1.0, timeout: float=30.0) -> str:
+    def get(h):
+        time.sleep(delay); return requests.get(url, headers={**HEADERS, **h}, timeout=timeout)
+    e = http_cache.shared().get_sync(url, get)
+    if e is None: raise RuntimeError(f"{url} is not cached (SCRAPER_OFFLINE)")
+    return e.text()
+
+class Documents:
+    """Parsed pages shared between providers: each URL is fetched and parsed once, and concurrent
+    callers asking for a URL already in flight wait for that request instead of issuing their own."""
+    def __init__(self, fetch: Callable[[str], str]=fetch, parser: str="lxml"):
+        self._fetch = fetch; self.parser = parser
+        self._lock = threading.Lock(); self._docs: Dict[str, Future] = {}
+        self.fetched = 0; self.shared = 0
+
+    def soup(self, url: str) -> BeautifulSoup:
+        with self._lock:
+            f = self._docs.get(url); owner = f is None
+            if owner: f = self._docs[url] = Future()
+            else: self.shared += 1
+        if owner:
+            try:
+                f.set_result(BeautifulSoup(self._fetch(url), self.parser)); self.fetched += 1
+            except BaseException as e:
+                f.set_exception(e)
+        return f.result()
+
+def run_providers(providers: Dict[str, Provider], docs: Optional[Documents]=None,
+                  workers: Optional[int]=None) -> Tuple[Dict[str, List[Dict[str, Any]]], Dict[str, float]]:
+    """Runs every provider concurrently; returns rows and seconds per provider (a failed provider yields no rows)."""
+    http_cache.shared()
+    docs = docs or Documents()
+    def timed(name: str, p: Provider):
+        t = time.perf_counter()
+        try:
+            return p(docs), time.perf_counter() - t
+        except Exception as e:
+            print(f"[WARN] {name} parse failed: {e}")
+            return [], time.perf_counter() - t
+    with ThreadPoolExecutor(max_workers=workers or len(providers) or 1) as ex:
+        futures = {name: ex.submit(timed, name, p) for name, p in providers.items()}
+        done = {name: f.result() for name, f in futures.items()}
+    rows = {name: r for name, (r, _) in done.items()}; timings = {name: t for name, (_, t) in done.items()}
+    print("[INFO] providers: " + ", ".join(f"{n} {len(rows[n])} rows in {t:.1f}s" for n, t in timings.items())
+          + f" ({docs.fetched} pages fetched, {docs.shared} reused)")
+    return rows, timings
@@ -0,0 +1,84 @@
+import os, re, asyncio
+from typing import Dict, Any, List, Optional, Iterable
+
+from scraper_latest.checkpoint import Checkpoint
+
+WIKI_API = "https://ru.wikipedia.org/w/api.php"
+# prop=extracts returns at most 20 intro extracts per request
+BATCH = 20
+TITLE_CACHE_PATH = os.getenv("WIKI_TITLE_CACHE", os.path.join(".cache", "wiki_titles.jsonl"))
+TITLE_CACHE_TTL = int(os.getenv("WIKI_TITLE_CACHE_TTL_SECONDS", str(30*24*3600)) or str(30*24*3600))
+SUMMARY_CHARS = 800
+FOUNDED_RX = re.compile(r"(основан[ао]?|год основан[ия]|учрежд[её]н[ао]?)\D{0,20}(\d{3,4})", re.I)
+
+def log(msg): print(f"[wiki] {msg}", flush=True)
+
+def founded(summary: Optional[str]) -> Optional[str]:
+    m = FOUNDED_RX.search(summary or "")
+    return m.group(2) if m else None
+
+def summary_of(page: Dict[str, Any]) -> Dict[str, Any]:
+    if "missing" in page or "invalid" in page: return {}
+    out = {"page": page.get("fullurl"), "summary": (page.get("extract") or "")[:SUMMARY_CHARS] or None}
+    y = founded(out["summary"])
+    if y: out["founded"] = y
+    return out
+
+def resolve(query: Dict[str, Any], titles: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    """Maps each requested title through normalized/redirects to its page summary ({} when there is no article)."""
+    hops = {n["from"]: n["to"] for n in query.get("normalized") or []}
+    hops.update({r["from"]: r["to"] for r in query.get("redirects") or []})
+    pages = {p.get("title"): p for p in (query.get("pages") or {}).values()}
+    out = {}
+    for t in titles:
+        cur = t; seen = {cur}
+        while cur in hops and hops[cur] not in seen:
+            cur = hops[cur]; seen.add(cur)
+        page = pages.get(cur)
+        out[t] = summary_of(page) if page is not None else {}
+    return out
+
+async def query_batch(crawler, titles: List[str]) -> Optional[Dict[str, Dict[str, Any]]]:
+    """One multi-title query (following `continue`), or None when a request failed."""
+    params = {"action": "query", "format": "json", "prop": "extracts|info", "inprop": "url", "exintro": 1,
+              "explaintext": 1, "exlimit": "max", "redirects": 1, "titles": "|".join(titles)}
+    merged: Dict[str, Any] = {}; cont: Dict[str, Any] = {}
+    while True:
+        data = await crawler.fetch_json(WIKI_API, params={**params, **cont})
+        if not isinstance(data, dict): return None
+        q = data.get("query") or {}
+        for k in ("normalized", "redirects"): merged.setdefault(k, []).extend(q.get(k) or [])
+        pages = merged.setdefault("pages", {})
+        for pid, p in (q.get("pages") or {}).items():
+            if pid in pages: pages[pid] = {**pages[pid], **{k: v for k, v in p.items() if v}}
+            else: pages[pid] = p
+        if "continue" not in data: break
+        cont = data["continue"]
+    return resolve(merged, titles)
+
+class TitleCache(Checkpoint):
+    """Summaries by requested title, kept across runs so only new or renamed titles hit the API."""
+    def __init__(self, path: str=TITLE_CACHE_PATH, max_age: Optional[float]=TITLE_CACHE_TTL):
+        super().__init__(path, max_age)
+
+    def close(self):
+        self.compact(); super().close()
+
+async def fetch_summaries(crawler, titles: Iterable[str], cache: Optional[TitleCache]=None, batch: int=BATCH) -> Dict[str, Optional[Dict[str, Any]]]:
+    """Summary per title: {} when Wikipedia has no article, None when its batch could not be fetched."""
+    titles = list(dict.fromkeys(t for t in titles if t))
+    out: Dict[str, Optional[Dict[str, Any]]] = {}
+    todo = []
+    for t in titles:
+        if "|" in t: out[t] = {}  # "|" separates titles in the API and cannot be part of one
+        elif cache is not None and cache.done(t): out[t] = cache.value(t)
+        else: todo.append(t)
+    chunks = [todo[i:i+batch] for i in range(0, len(todo), batch)]
+    if chunks: log(f"{len(todo)} titles in {len(chunks)} requests ({len(titles)-len(todo)} cached)")
+    results = await asyncio.gather(*(query_batch(crawler, c) for c in chunks))
+    for chunk, res in zip(chunks, results):
+        for t in chunk:
+            v = res.get(t) if res is not None else None
+            out[t] = v
+            if cache is not None and v is not None: cache.record(t, v)
+    return out
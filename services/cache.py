@@ -0,0 +1,101 @@
+import os, re, glob, time, secrets, tempfile
+from typing import Callable, Dict, Any, Hashable, Optional, Sequence
+import orjson
+from cachetools import TTLCache
+from services.fuzzy import query_tokens
+
+# budget is counted in cached row ids across all entries, not in entries
+RESULT_CACHE_BUDGET = int(os.getenv("RESULT_CACHE_BUDGET","200000") or "200000")
+RESULT_CACHE_TTL = int(os.getenv("RESULT_CACHE_TTL_SECONDS","300") or "300")
+PAGE_SESSIONS = int(os.getenv("PAGE_SESSIONS","10000") or "10000")
+PAGE_SESSION_TTL = int(os.getenv("PAGE_SESSION_TTL_SECONDS","3600") or "3600")
+# shared sessions: expired files are swept after this many opens
+PAGE_PRUNE_EVERY = 500
+_TOKEN = re.compile(r"[A-Za-z0-9_-]{1,16}")
+
+def normalize_query(query: str, mode: str="exact") -> str:
+    # only fold what the search itself folds, so equal keys always mean equal results
+    if mode == "fuzzy": return " ".join(query_tokens(query))
+    return (query or "").lower().strip()
+
+class QueryCache:
+    """Search results (row ids) keyed on (mode, normalized query, limit, filters, dataset version).
+
+    A new dataset version simply stops matching old keys; stale entries age out through LRU/TTL.
+    """
+    def __init__(self, budget: int=RESULT_CACHE_BUDGET, ttl: int=RESULT_CACHE_TTL):
+        self._c = TTLCache(maxsize=budget, ttl=ttl, getsizeof=lambda ids: len(ids)+1)
+        self.hits = 0; self.misses = 0
+
+    def ids(self, mode: str, query: str, limit: int, version: Hashable,
+            compute: Callable[[], Sequence[int]], filters: Hashable=()) -> Sequence[int]:
+        key = (mode, normalize_query(query, mode), limit, filters, version)
+        v = self._c.get(key)
+        if v is not None:
+            self.hits += 1; return v
+        self.misses += 1
+        v = tuple(compute())
+        try: self._c[key] = v
+        except ValueError: pass  # a single result bigger than the whole budget
+        return v
+
+    def clear(self):
+        self._c.clear()
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits/total if total else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {"hits": self.hits, "misses": self.misses, "hit_ratio": round(self.hit_ratio, 4),
+                "entries": len(self._c), "size": self._c.currsize, "budget": self._c.maxsize}
+
+class PageSessions:
+    """Bot pagination state behind a short token (Telegram callback data is limited to 64 bytes).
+
+    A session keeps the query and the cursor every visited page started at, so both directions
+    resume from a known cursor instead of searching from the top again. Sessions live in this process
+    until share() moves them to JSON files, so a button press can land on any worker.
+    """
+    def __init__(self, maxsize: int=PAGE_SESSIONS, ttl: int=PAGE_SESSION_TTL):
+        self._c = TTLCache(maxsize=maxsize, ttl=ttl); self.ttl = ttl
+        self.root: Optional[str] = None; self._saved = 0
+
+    def share(self, root: str):
+        os.makedirs(root, exist_ok=True); self.root = root
+
+    def open(self, mode: str, query: str, version: Hashable, start: int, nxt: int, filters: Any=None) -> str:
+        """`filters` must be JSON-serializable (a FacetFilter key) so shared sessions can store it."""
+        token = secrets.token_urlsafe(6)
+        self.save(token, {"mode": mode, "query": query, "version": version, "starts": [start, nxt], "filters": filters})
+        return token
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        if self.root is None: return self._c.get(token)
+        if not _TOKEN.fullmatch(token): return None  # tokens come back in client-supplied callback data
+        path = os.path.join(self.root, token + ".json")
+        try:
+            if time.time() - os.stat(path).st_mtime > self.ttl: return None
+            with open(path, "rb") as f: return orjson.loads(f.read())
+        except (OSError, ValueError):
+            return None
+
+    def save(self, token: str, session: Dict[str, Any]):
+        """Stores a new or changed session (one whose `starts` grew)."""
+        if self.root is None: self._c[token] = session; return
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix=".page-")
+        with os.fdopen(fd, "wb") as f: f.write(orjson.dumps(session))
+        os.replace(tmp, os.path.join(self.root, token + ".json"))
+        self._saved += 1
+        if self._saved % PAGE_PRUNE_EVERY == 0: self._prune()
+
+    def _prune(self):
+        cutoff = time.time() - self.ttl
+        for path in glob.glob(os.path.join(self.root, "*.json")):
+            try:
+                if os.stat(path).st_mtime < cutoff: os.unlink(path)
+            except OSError: pass
+
+RESULTS = QueryCache()
+PAGES = PageSessions()
@@ -0,0 +1,173 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import compress, tee
+from typing import Any, Dict, Hashable, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from services.store import Dataset
+
+# a difficulty span longer than this share of the rows is tested by rank instead of sorted into row order
+DENSE_SHARE = 1/16
+
+_EMPTY = array("I")
+
+def _key(v) -> Optional[str]:
+    # same folding as the leaderboard city views, so /filter and /topdifficulty agree on what a city is;
+    # non-strings (a NaN from a spreadsheet cell) are not facet values
+    if not isinstance(v, str): return None
+    return v.strip().lower() or None
+
+def _year(v) -> Optional[int]:
+    if v is None or v == "": return None
+    try: return int(v)
+    except (TypeError, ValueError): return None
+
+def _number(v) -> Optional[float]:
+    if v is None or v == "" or isinstance(v, bool): return None
+    try: f = float(v)
+    except (TypeError, ValueError): return None
+    return f if f == f else None
+
+def _gallop(head: Iterable[int], rest: List[Sequence[int]]) -> Iterator[int]:
+    pos = [0]*len(rest)
+    for i in head:
+        for k, p in enumerate(rest):
+            j = bisect_left(p, i, pos[k]); pos[k] = j
+            if j == len(p): return
+            if p[j] != i: break
+        else:
+            yield i
+
+def intersect(lists: List[Sequence[int]], start: int=0) -> Iterator[int]:
+    """Row ids from `start` up that are in every one of the sorted `lists`: the shortest one is walked
+    and each of its ids galloped to in the rest."""
+    lists = sorted(lists, key=len); head = lists[0]
+    k = bisect_left(head, start) if start else 0
+    if k: head = memoryview(head)[k:]
+    return _gallop(head, lists[1:]) if len(lists) > 1 else iter(head)
+
+class FacetFilter:
+    """Structured /find and /filter conditions; unset fields do not filter. Difficulty bounds are inclusive."""
+    __slots__ = ("city", "source", "year", "dmin", "dmax")
+
+    def __init__(self, city: Optional[str]=None, source: Optional[str]=None, year: Optional[int]=None,
+                 dmin: Optional[float]=None, dmax: Optional[float]=None):
+        self.city = _key(city); self.source = _key(source); self.year = year
+        self.dmin = dmin; self.dmax = dmax
+
+    def __bool__(self) -> bool:
+        return any(v is not None for v in self.key())
+
+    def key(self) -> Hashable:
+        return (self.city, self.source, self.year, self.dmin, self.dmax)
+
+class Selection:
+    """Rows matching one filter on one FacetIndex, found lazily: a page costs about as many steps as rows it looks at.
+
+    rows() walks the shortest of the city, source and year postings and gallops through the others. The
+    difficulty range is a span of positions in the difficulty ordering: a row is in it when its rank is,
+    and a span shorter than every posting list is sorted into row order to drive the walk instead.
+    """
+    __slots__ = ("facets", "filter", "_parts", "_span", "_lists")
+
+    def __init__(self, facets: "FacetIndex", flt: FacetFilter):
+        self.facets = facets; self.filter = flt; self._parts = facets.postings(flt)
+        self._span = facets.span(flt) if flt.dmin is not None or flt.dmax is not None else None
+        self._lists: Optional[Tuple[List[Sequence[int]], bool]] = None
+
+    @property
+    def key(self) -> Hashable:
+        return self.filter.key()
+
+    def estimate(self) -> int:
+        """Upper bound on the matching rows: the shortest posting list or the difficulty span."""
+        sizes = [len(p) for p in self._parts]
+        if self._span is not None: sizes.append(len(self._span))
+        return min(sizes, default=self.facets.n)
+
+    def _walk(self) -> Tuple[List[Sequence[int]], bool]:
+        # the lists rows() intersects, and whether ranks still have to be tested against the span
+        if self._lists is None:
+            lists = list(self._parts); span = self._span; test = span is not None
+            if test and len(span) <= min(map(len, lists), default=len(span)) and len(span) <= DENSE_SHARE*self.facets.n:
+                lists.append(array("I", sorted(self.facets.diff_order[span.start:span.stop]))); test = False
+            self._lists = lists, test
+        return self._lists
+
+    def rows(self, start: int=0) -> Iterator[int]:
+        lists, test = self._walk()
+        rows = intersect(lists, start) if lists else iter(range(start, self.facets.n))
+        if not test: return rows
+        rows, probe = tee(rows)
+        return compress(rows, map(self._span.__contains__, map(self.facets.diff_rank.__getitem__, probe)))
+
+    def has(self, i: int) -> bool:
+        for p in self._parts:
+            j = bisect_left(p, i)
+            if j == len(p) or p[j] != i: return False
+        return self._span is None or self.facets.diff_rank[i] in self._span
+
+    def keep(self, ids: Sequence[int]) -> List[int]:
+        return [i for i in ids if self.has(i)]
+
+class FacetIndex:
+    """Sorted row id postings per city, rating_source and rating_year, plus the rows ordered by difficulty_index.
+
+    Postings only hold the rows that have the value, so together they take four bytes a row however many
+    distinct values there are. `diff_order` lists the rows with a difficulty by (difficulty, row id),
+    `diff_values` their difficulties, and `diff_rank` each row's position in it (past the end when it has
+    none): a range is two bisects over diff_values and a rank span.
+    """
+    __slots__ = ("n", "city", "source", "year", "diff_order", "diff_values", "diff_rank")
+
+    def __init__(self, data: Iterable[Dict[str, Any]]):
+        if isinstance(data, Dataset):
+            cols = zip(*(data.values(k) for k in ("city", "rating_source", "rating_year", "difficulty_index")))
+        else:
+            cols = ((r.get("city"), r.get("rating_source"), r.get("rating_year"), r.get("difficulty_index")) for r in data)
+        city: Dict[str, array] = {}; source: Dict[str, array] = {}; year: Dict[int, array] = {}
+        diff: Dict[int, float] = {}; keys: Dict[Any, Any] = {}; n = 0
+        for i, (c, s, y, d) in enumerate(cols):
+            n = i+1
+            if c is not None:
+                k = keys.get(c, keys)
+                if k is keys: k = keys[c] = _key(c)
+                if k: city.setdefault(k, array("I")).append(i)
+            if s is not None:
+                k = keys.get(s, keys)
+                if k is keys: k = keys[s] = _key(s)
+                if k: source.setdefault(k, array("I")).append(i)
+            y = _year(y)
+            if y is not None: year.setdefault(y, array("I")).append(i)
+            d = _number(d)
+            if d is not None: diff[i] = d
+        self.n = n; self.city = city; self.source = source; self.year = year
+        order = sorted(diff, key=diff.__getitem__)  # stable: rows with equal difficulty stay in row order
+        self.diff_order = array("I", order)
+        self.diff_values = array("d", (diff[i] for i in order))
+        rank = array("I", [len(order)])*n
+        for r, i in enumerate(order): rank[i] = r
+        self.diff_rank = rank
+
+    def __len__(self) -> int:
+        return self.n
+
+    def postings(self, f: FacetFilter) -> List[Sequence[int]]:
+        """The posting lists f's city, source and year select (an empty one for an unknown value)."""
+        parts = []
+        if f.city is not None: parts.append(self.city.get(f.city, _EMPTY))
+        if f.source is not None: parts.append(self.source.get(f.source, _EMPTY))
+        if f.year is not None: parts.append(self.year.get(f.year, _EMPTY))
+        return parts
+
+    def span(self, f: FacetFilter) -> range:
+        """Positions in diff_order of the rows within f's difficulty bounds."""
+        vs = self.diff_values
+        lo = bisect_left(vs, f.dmin) if f.dmin is not None else 0
+        hi = max(lo, bisect_right(vs, f.dmax)) if f.dmax is not None else len(vs)
+        return range(lo, hi)
+
+    def select(self, f: FacetFilter) -> Selection:
+        return Selection(self, f)
+
+    def cities(self) -> List[str]:
+        return sorted(self.city)
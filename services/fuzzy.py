@@ -0,0 +1,155 @@
+import math, re
+from itertools import repeat
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from typing import Dict, Any, List, Tuple, Iterable
+
+TRANSLIT = str.maketrans({
+    "а":"a","б":"b","в":"v","г":"g","д":"d","е":"e","ё":"e","ж":"zh","з":"z","и":"i","й":"y","к":"k","л":"l",
+    "м":"m","н":"n","о":"o","п":"p","р":"r","с":"s","т":"t","у":"u","ф":"f","х":"h","ц":"ts","ч":"ch","ш":"sh",
+    "щ":"sch","ъ":"","ы":"y","ь":"","э":"e","ю":"yu","я":"ya",
+})
+# Latin spellings people type for the same sounds
+LATIN_FOLD = [("kh","h"),("j","y"),("w","v"),("x","ks"),("q","k")]
+ABBR_WORDS = {"санкт-петербургский":"спб","санкт-петербург":"спб"}
+ABBR_SKIP = {"им","имени","и"}
+# colloquial names that share no letters with the official ones
+ALIASES = {"питер":"спб","физтех":"мфти","бауманка":"мгту","вышка":"вшэ","политех":"политехнический"}
+_NON_WORD = re.compile(r"[^0-9a-z]+")
+_CYR_WORD = re.compile(r"[0-9a-zа-я-]+")
+
+MIN_SIMILARITY = 0.45
+MIN_SCORE = 0.5
+MAX_CANDIDATES = 400
+
+def fold(s: str) -> str:
+    s = (s or "").lower().translate(TRANSLIT)
+    for a, b in LATIN_FOLD: s = s.replace(a, b)
+    return _NON_WORD.sub(" ", s).strip()
+
+def tokens(s: str) -> List[str]:
+    return fold(s).split()
+
+def query_tokens(s: str) -> List[str]:
+    return list(dict.fromkeys(tokens(" ".join(ALIASES.get(w, w) for w in (s or "").lower().replace("ё","е").split()))))
+
+def _initials(text: str) -> str:
+    out = []
+    for w in _CYR_WORD.findall(text):
+        if w in ABBR_SKIP: break
+        if w in ABBR_WORDS: out.append(ABBR_WORDS[w]); continue
+        out.extend(p[0] for p in w.split("-") if p)
+    abbr = "".join(out)
+    return fold(abbr) if len(abbr) >= 2 else ""
+
+def abbreviations(name: str) -> List[str]:
+    """Initial-letter abbreviations: МГТУ for the full name, ВШЭ for a «quoted» short name."""
+    name = (name or "").lower().replace("ё","е")
+    out = [_initials(name)]
+    m = re.search(r"«([^»]+)»|\"([^\"]+)\"", name)
+    if m: out.append(_initials(m.group(1) or m.group(2)))
+    return [a for a in dict.fromkeys(out) if a]
+
+def grams(tok: str) -> set:
+    t = f" {tok} "
+    return {t[i:i+3] for i in range(len(t)-2)}
+
+class FuzzyIndex:
+    """Typo-tolerant ranked lookup over distinct university/city names.
+
+    Candidates come from a trigram index over the token vocabulary (plus a sorted
+    vocabulary for prefixes), so a query never compares against every row.
+    """
+    __slots__ = ("vocab", "vocab_grams", "gram_postings", "token_docs", "doc_tokens", "doc_len", "doc_rows")
+
+    def __init__(self, data: Iterable[Dict[str, Any]]):
+        docs: Dict[Tuple[str, str], int] = {}
+        doc_rows: List[List[int]] = []; doc_tokens: List[Tuple[int, ...]] = []; doc_len: List[int] = []
+        vocab: Dict[str, int] = {}
+        for i, r in enumerate(data):
+            uni = str(r.get("university") or ""); city = str(r.get("city") or "")
+            key = (uni, city)
+            d = docs.get(key)
+            if d is None:
+                d = docs[key] = len(doc_rows); doc_rows.append([])
+                toks = tokens(uni) + tokens(city) + abbreviations(uni)
+                doc_tokens.append(tuple(vocab.setdefault(t, len(vocab)) for t in dict.fromkeys(toks)))
+                doc_len.append(len(uni))
+            doc_rows[d].append(i)
+        # renumber tokens in sorted order so a prefix is a contiguous id range
+        self.vocab = sorted(vocab)
+        remap = array("I", [0])*len(vocab)
+        for t, tok in enumerate(self.vocab): remap[vocab[tok]] = t
+        doc_tokens = [tuple(remap[t] for t in toks) for toks in doc_tokens]
+        self.vocab_grams = [len(grams(t)) for t in self.vocab]
+        post: Dict[str, array] = {}
+        for t, tok in enumerate(self.vocab):
+            for g in grams(tok):
+                p = post.get(g)
+                if p is None: p = post[g] = array("I")
+                p.append(t)
+        self.gram_postings = post
+        token_docs: List[array] = [array("I") for _ in self.vocab]
+        for d, toks in enumerate(doc_tokens):
+            for t in toks: token_docs[t].append(d)
+        self.token_docs = token_docs
+        self.doc_tokens = doc_tokens
+        self.doc_len = doc_len
+        self.doc_rows = [array("I", rows) for rows in doc_rows]
+
+    def _similar(self, qt: str) -> Dict[int, float]:
+        qg = grams(qt); overlap: Counter = Counter()
+        for g in qg:
+            p = self.gram_postings.get(g)
+            if p is not None: overlap.update(p)
+        out: Dict[int, float] = {}
+        n = len(qg); vg = self.vocab_grams
+        for t, c in overlap.items():
+            s = 2.0*c/(n+vg[t])
+            if s >= MIN_SIMILARITY: out[t] = s
+        if len(qt) >= 3:
+            vs = self.vocab; t = bisect_left(vs, qt)
+            while t < len(vs) and vs[t].startswith(qt):
+                out[t] = max(out.get(t, 0.0), 1.0 if vs[t] == qt else 0.9); t += 1
+        return out
+
+    def search_docs(self, query: str, limit: int=20) -> List[Tuple[int, float]]:
+        qts = query_tokens(query)
+        if not qts: return []
+        ndocs = len(self.doc_rows)
+        sims = [self._similar(qt) for qt in qts]
+        weights = []
+        for sm in sims:
+            df = min((len(self.token_docs[t]) for t in sm), default=ndocs)
+            weights.append(math.log(1 + ndocs/(1+df)))
+        # candidates come from the best matches of the most selective query tokens first
+        order = sorted(range(len(qts)), key=lambda k: sum(len(self.token_docs[t]) for t in sims[k]))
+        cand: Dict[int, None] = {}
+        for k in order:
+            sm = sims[k]
+            for t in sorted(sm, key=sm.get, reverse=True):
+                for d in self.token_docs[t]:
+                    cand[d] = None
+                    if len(cand) >= MAX_CANDIDATES: break
+                if len(cand) >= MAX_CANDIDATES: break
+            if len(cand) >= MAX_CANDIDATES: break
+        total = sum(weights) or 1.0
+        scored = []
+        for d in cand:
+            toks = self.doc_tokens[d]; s = 0.0
+            for sm, w in zip(sims, weights):
+                if sm and toks: s += w*max(map(sm.get, toks, repeat(0.0)))
+            s /= total
+            if s >= MIN_SCORE: scored.append((-s, self.doc_len[d], d))
+        scored.sort()
+        return [(d, -s) for s, _, d in scored[:limit]]
+
+    def find(self, query: str, limit: int=20) -> List[int]:
+        out: List[int] = []
+        if limit <= 0: return out
+        for d, _ in self.search_docs(query, limit):
+            for i in self.doc_rows[d]:
+                out.append(i)
+                if len(out) >= limit: return out
+        return out
@@ -0,0 +1,179 @@
+from array import array
+from bisect import bisect_left, insort
+from typing import Dict, List, Tuple, Optional, Iterable, Sequence
+
+from services.store import Dataset
+
+Entry = Tuple[int, int, int]  # (-difficulty_index, rating_position, row id)
+Facets = Tuple[Optional[str], Optional[int], Optional[str]]  # (rating_source, rating_year, city)
+
+# a refresh touching more rows than this share of the dataset is rebuilt from scratch
+INCREMENTAL_MAX_SHARE = 0.1
+
+def _int(v, default: int) -> int:
+    if v is None or v == "": return default
+    try: return int(v)
+    except (TypeError, ValueError): return default
+
+def _facets(src, year, city) -> Facets:
+    try: year = int(year) if year is not None else None
+    except (TypeError, ValueError): pass
+    city = city.strip().lower() or None if isinstance(city, str) else None
+    return (src if isinstance(src, str) and src else None), year, city
+
+def _rows(ds: Dataset) -> Iterable[Tuple[Entry, Facets]]:
+    d = ds.values("difficulty_index"); p = ds.values("rating_position")
+    s = ds.values("rating_source"); y = ds.values("rating_year"); c = ds.values("city")
+    for i in range(len(ds)):
+        yield (-_int(d[i] or 0, 0), _int(p[i], 10**9), i), _facets(s[i], y[i], c[i])
+
+class Leaderboards:
+    """Difficulty leaderboards per dataset version: a global ordering plus one per source, year, source+year and city."""
+    __slots__ = ("all", "views", "entries", "facets")
+
+    def __init__(self, ds: Optional[Dataset]=None):
+        self.all: List[Entry] = []
+        self.views: Dict[tuple, List[Entry]] = {}
+        self.entries: List[Entry] = []
+        self.facets: List[Facets] = []
+        if ds is None: return
+        for e, f in _rows(ds):
+            self.entries.append(e); self.facets.append(f)
+            for key in self._view_keys(f): self.views.setdefault(key, []).append(e)
+        self.all = sorted(self.entries)
+        for v in self.views.values(): v.sort()
+
+    @classmethod
+    def from_orderings(cls, ds: Dataset, all_ids: Sequence[int], views: Dict[tuple, Sequence[int]]) -> "Leaderboards":
+        """Rebuilds leaderboards from saved row id orderings without sorting (see services.snapshot)."""
+        lb = cls()
+        for e, f in _rows(ds):
+            lb.entries.append(e); lb.facets.append(f)
+        en = lb.entries
+        lb.all = [en[i] for i in all_ids]
+        lb.views = {k: [en[i] for i in ids] for k, ids in views.items()}
+        return lb
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @staticmethod
+    def _view_keys(f: Facets) -> List[tuple]:
+        src, year, city = f; keys = []
+        if src: keys.append(("source", src))
+        if year is not None: keys.append(("year", year))
+        if src and year is not None: keys.append(("source_year", src, year))
+        if city: keys.append(("city", city))
+        return keys
+
+    def sources(self) -> List[str]:
+        return sorted(k[1] for k in self.views if k[0] == "source")
+
+    def years(self) -> List[int]:
+        return sorted(k[1] for k in self.views if k[0] == "year")
+
+    def cities(self) -> List[str]:
+        return sorted(k[1] for k in self.views if k[0] == "city")
+
+    def top(self, n: int=20, source: Optional[str]=None, year: Optional[int]=None, city: Optional[str]=None) -> List[int]:
+        city = city.strip().lower() if city else None
+        wanted = []
+        if source and year is not None: wanted.append(("source_year", source, year))
+        elif source: wanted.append(("source", source))
+        elif year is not None: wanted.append(("year", year))
+        if city: wanted.append(("city", city))
+        if not wanted: return self._head(self.all, n)
+        views = [self.views.get(k) for k in wanted]
+        if any(v is None for v in views): return []
+        base = min(views, key=len)
+        if len(views) == 1: return self._head(base, n)
+        out = []
+        for i in self._ids(base):
+            fs, fy, fc = self._row_facets(i)
+            if source and fs != source or year is not None and fy != year or city and fc != city: continue
+            out.append(i)
+            if len(out) >= n: break
+        return out
+
+    @staticmethod
+    def _head(seq: Sequence[Entry], n: int) -> List[int]:
+        return [e[2] for e in seq[:n]]
+
+    @staticmethod
+    def _ids(seq: Sequence[Entry]) -> Iterable[int]:
+        return (e[2] for e in seq)
+
+    def _row_facets(self, i: int) -> Facets:
+        return self.facets[i]
+
+    def orderings(self) -> Tuple[Sequence[int], Dict[tuple, Sequence[int]]]:
+        """Row ids of the global ordering and of every view, as services.snapshot stores them."""
+        return array("I", self._ids(self.all)), {k: array("I", self._ids(v)) for k, v in self.views.items()}
+
+    def heads(self, n: int) -> List[int]:
+        """Row ids on the first n places of the global ordering and of every single view."""
+        out = dict.fromkeys(self._head(self.all, n))
+        for v in self.views.values(): out.update(dict.fromkeys(self._head(v, n)))
+        return list(out)
+
+    def _copy(self) -> "Leaderboards":
+        lb = Leaderboards()
+        lb.all = self.all.copy(); lb.entries = self.entries.copy(); lb.facets = self.facets.copy()
+        lb.views = {k: v.copy() for k, v in self.views.items()}
+        return lb
+
+    def _remove(self, i: int):
+        e = self.entries[i]
+        for seq in [self.all] + [self.views[k] for k in self._view_keys(self.facets[i])]:
+            j = bisect_left(seq, e)
+            if j < len(seq) and seq[j] == e: del seq[j]
+        for k in self._view_keys(self.facets[i]):
+            if not self.views[k]: del self.views[k]
+
+    def _insert(self, i: int, e: Entry, f: Facets):
+        self.entries[i] = e; self.facets[i] = f
+        insort(self.all, e)
+        for k in self._view_keys(f): insort(self.views.setdefault(k, []), e)
+
+    def refresh(self, ds: Dataset) -> "Leaderboards":
+        """Leaderboards for a new dataset version, patched instead of rebuilt when few rows changed."""
+        fresh = list(_rows(ds)); n_old, n_new = len(self.entries), len(fresh)
+        changed = [i for i in range(min(n_old, n_new)) if fresh[i] != (self.entries[i], self.facets[i])]
+        removed = list(range(n_new, n_old)); added = list(range(n_old, n_new))
+        if len(changed) + len(removed) + len(added) > INCREMENTAL_MAX_SHARE*max(n_new, 1):
+            return Leaderboards(ds)
+        lb = self._copy()
+        for i in changed + removed: lb._remove(i)
+        del lb.entries[n_new:]; del lb.facets[n_new:]
+        lb.entries.extend([None]*len(added)); lb.facets.extend([None]*len(added))
+        for i in changed + added: lb._insert(i, *fresh[i])
+        return lb
+
+class MappedLeaderboards(Leaderboards):
+    """Leaderboards over saved row id orderings (memoryviews into a snapshot) instead of entry tuples.
+
+    Nothing is built per row: `all` and the views are the mapped id arrays and a row's facets are read
+    from the dataset when a query combines views. refresh() builds ordinary Leaderboards first.
+    """
+    __slots__ = ("ds",)
+
+    def __init__(self, ds: Dataset, all_ids: Sequence[int], views: Dict[tuple, Sequence[int]]):
+        super().__init__(); self.ds = ds; self.all = all_ids; self.views = views
+
+    def __len__(self) -> int:
+        return len(self.ds)
+
+    @staticmethod
+    def _head(seq: Sequence[int], n: int) -> List[int]:
+        return list(seq[:n])
+
+    @staticmethod
+    def _ids(seq: Sequence[int]) -> Iterable[int]:
+        return seq
+
+    def _row_facets(self, i: int) -> Facets:
+        r = self.ds[i]
+        return _facets(r.get("rating_source"), r.get("rating_year"), r.get("city"))
+
+    def refresh(self, ds: Dataset) -> Leaderboards:
+        return Leaderboards.from_orderings(self.ds, self.all, self.views).refresh(ds)
@@ -0,0 +1,110 @@
+import os, csv, json, tempfile
+from typing import Dict, Any, Iterator, Optional, Tuple, IO
+import orjson, httpx
+
+from services.store import Dataset
+
+# JSON files above this size are decoded incrementally instead of with one orjson.loads
+STREAM_THRESHOLD = int(os.getenv("DATA_STREAM_THRESHOLD_BYTES", str(8 << 20)) or str(8 << 20))
+CHUNK_SIZE = 1 << 16
+
+_client: Optional[httpx.AsyncClient] = None
+
+def client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(timeout=30.0, limits=httpx.Limits(max_connections=4, max_keepalive_connections=2))
+    return _client
+
+async def close_client():
+    global _client
+    if _client is not None: await _client.aclose(); _client = None
+
+async def download(url: str, headers: Optional[Dict[str, str]]=None) -> Tuple[Optional[str], Dict[str, str], int]:
+    """Streams the body to a temp file; returns (path, headers, status), path is None on 304."""
+    async with client().stream("GET", url, headers=headers or {}) as r:
+        s = r.status_code
+        if s == 304: return None, dict(r.headers), s
+        if s != 200: r.raise_for_status()
+        fd, path = tempfile.mkstemp(prefix="dataset-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                async for chunk in r.aiter_bytes(CHUNK_SIZE): f.write(chunk)
+        except BaseException:
+            os.unlink(path); raise
+        return path, dict(r.headers), s
+
+def data_format(path: str) -> str:
+    p = path.lower()
+    if p.endswith(".json"): return "json"
+    if p.endswith(".csv"): return "csv"
+    raise RuntimeError("Unsupported format")
+
+_WS = " \t\r\n"
+
+def iter_json_array(fp: IO[str], chunk_size: int=CHUNK_SIZE) -> Iterator[Any]:
+    """Yields the elements of a top-level JSON array (or of an {"items": [...]} object) one at a time."""
+    dec = json.JSONDecoder(); buf = ""; pos = 0; eof = False
+    def fill():
+        nonlocal buf, pos, eof
+        more = fp.read(chunk_size)
+        if not more: eof = True
+        buf = buf[pos:] + more; pos = 0
+    def peek() -> str:
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in _WS: pos += 1
+            if pos < len(buf): return buf[pos]
+            if eof: return ""
+            fill()
+    c = peek()
+    if c == "{":
+        obj = json.loads(buf[pos:] + fp.read())
+        yield from (obj.get("items") or []) if isinstance(obj, dict) else []
+        return
+    if c != "[": raise ValueError("expected a JSON array")
+    pos += 1
+    if peek() == "]": return
+    while True:
+        peek()
+        while True:
+            try:
+                obj, end = dec.raw_decode(buf, pos)
+                if end < len(buf) or eof: break
+            except json.JSONDecodeError:
+                if eof: raise
+            fill()  # element may continue past the buffer end
+        pos = end
+        yield obj
+        c = peek()
+        if c == ",": pos += 1; continue
+        if c == "]": return
+        raise ValueError("malformed JSON array")
+
+def iter_rows(path: str, fmt: str) -> Iterator[Dict[str, Any]]:
+    if fmt == "json":
+        if os.path.getsize(path) <= STREAM_THRESHOLD:
+            with open(path, "rb") as f: raw = f.read()
+            try: obj = orjson.loads(raw)
+            except orjson.JSONDecodeError:
+                # NaN/Infinity (json.dump writes them for missing ratings) and a BOM, as the streaming path accepts
+                obj = json.loads(raw.decode("utf-8-sig"))
+            if isinstance(obj, dict): obj = obj.get("items") or []
+            yield from obj
+            return
+        with open(path, "r", encoding="utf-8-sig") as f:
+            yield from iter_json_array(f)
+        return
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        yield from csv.DictReader(f)
+
+def read_dataset(path: str, fmt: str) -> Dataset:
+    """Parses a downloaded or local dataset file straight into a Dataset; meant to run in a worker thread."""
+    try:
+        return Dataset.from_rows(iter_rows(path, fmt))
+    except csv.Error:
+        import pandas as pd
+        ds = Dataset()
+        for chunk in pd.read_csv(path, chunksize=50_000):
+            for r in chunk.to_dict(orient="records"): ds.append(r)
+        return ds
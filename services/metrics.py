@@ -0,0 +1,177 @@
+import os, glob, tempfile
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+import orjson
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LOAD_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 1000)
+
+Labels = Tuple[str, ...]
+Family = Tuple[str, str, str, List[str]]  # (name, kind, help, rendered sample lines)
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Sequence[str], values: Sequence[str], *extra: str) -> str:
+    pairs = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    pairs += [e for e in extra if e]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _num(v: float) -> str:
+    if v == float("inf"): return "+Inf"
+    return repr(float(v)) if isinstance(v, float) and not v.is_integer() else str(int(v))
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str]=(), fn: Optional[Callable[[], object]]=None):
+        self.name = name; self.help = help; self.labelnames = tuple(labelnames); self.fn = fn
+        self._children: Dict[Labels, object] = {}
+
+    def labels(self, *values) -> object:
+        """Child for one label combination; keep the result around on hot paths to skip the dict lookup."""
+        c = self._children.get(values)
+        if c is None: c = self._children[values] = self._child()
+        return c
+
+    def _child(self) -> object: return _Value()
+
+    def _values(self) -> List[Tuple[Labels, float]]:
+        """Current values; with `fn` they are read at scrape time (a number, or {label values: number})."""
+        if self.fn is None: return [(values, c.value) for values, c in list(self._children.items())]
+        v = self.fn()
+        return list(v.items()) if isinstance(v, dict) else [((), v)]
+
+    def samples(self, const: str="") -> Iterable[Tuple[str, str, float]]:
+        for values, v in self._values(): yield "", _labels(self.labelnames, values, const), v
+
+    def lines(self, const: str="") -> List[str]:
+        """Sample lines; `const` is a rendered label pair added to every sample (the registry's const_labels)."""
+        return [f"{self.name}{suffix}{labels} {_num(v)}" for suffix, labels, v in self.samples(const)]
+
+class _Value:
+    __slots__ = ("value",)
+    def __init__(self): self.value = 0.0
+    def inc(self, n: float=1.0): self.value += n
+    def set(self, v: float): self.value = v
+
+class Counter(Metric):
+    kind = "counter"
+    def inc(self, n: float=1.0): self.labels().inc(n)
+    def samples(self, const: str=""):
+        for values, v in self._values(): yield "_total", _labels(self.labelnames, values, const), v
+
+class Gauge(Metric):
+    kind = "gauge"
+    def set(self, v: float): self.labels().set(v)
+
+class _Histogram:
+    __slots__ = ("bounds", "counts", "sum")
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds; self.counts = [0]*(len(bounds)+1); self.sum = 0.0
+    def observe(self, v: float):
+        # per-bucket counts; the cumulative `le` series is only built when scraped
+        self.counts[bisect_left(self.bounds, v)] += 1; self.sum += v
+
+class Histogram(Metric):
+    kind = "histogram"
+    def __init__(self, name: str, help: str, labelnames: Sequence[str]=(), buckets: Sequence[float]=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames); self.buckets = tuple(sorted(buckets))
+    def _child(self): return _Histogram(self.buckets)
+    def observe(self, v: float): self.labels().observe(v)
+    def samples(self, const: str=""):
+        for values, h in list(self._children.items()):
+            counts = list(h.counts); total = 0
+            for le, c in zip(self.buckets + (float("inf"),), counts):
+                total += c; yield "_bucket", _labels(self.labelnames, values, const, f'le="{_num(le)}"'), total
+            yield "_sum", _labels(self.labelnames, values, const), h.sum
+            yield "_count", _labels(self.labelnames, values, const), total
+
+class Registry:
+    """Metrics rendered in the Prometheus text format.
+
+    Updates are plain attribute writes with no locking: they all happen on the event loop thread,
+    and a scrape racing one only sees a sample from a moment earlier.
+    """
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        # labels on every series, e.g. {"worker": pid} when several processes are scraped behind one port
+        self.const_labels: Dict[str, str] = {}
+
+    def register(self, m: Metric) -> Metric:
+        if m.name in self._metrics: raise ValueError(f"metric {m.name} already registered")
+        self._metrics[m.name] = m; return m
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str]=(), fn: Optional[Callable[[], object]]=None) -> Counter:
+        return self.register(Counter(name, help, labelnames, fn))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str]=(), fn: Optional[Callable[[], object]]=None) -> Gauge:
+        return self.register(Gauge(name, help, labelnames, fn))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str]=(), buckets: Sequence[float]=LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def collect(self) -> List[Family]:
+        const = _labels(list(self.const_labels), list(self.const_labels.values()))[1:-1]
+        return [(m.name, m.kind, m.help, m.lines(const)) for m in list(self._metrics.values())]
+
+    def render(self, others: Iterable[List[Family]]=()) -> str:
+        """This registry's metrics, with the samples of `others` (other processes' collect()) merged into each family."""
+        families: Dict[str, Family] = {}
+        for fams in [self.collect(), *others]:
+            for name, kind, help, lines in fams:
+                f = families.get(name)
+                if f is None: families[name] = (name, kind, help, list(lines))
+                else: f[3].extend(lines)
+        out: List[str] = []
+        for name, kind, help, lines in families.values():
+            out += [f"# HELP {name} {help}", f"# TYPE {name} {kind}", *lines]
+        return "\n".join(out) + "\n"
+
+class SharedMetrics:
+    """Metrics of all worker processes of one host, served by whichever worker is scraped.
+
+    Each worker writes its registry's samples to root/<pid>.json (flush(), called every few seconds) and
+    render() merges the other live workers' files into its own fresh samples. Series stay apart by the
+    `worker` const label, so every counter keeps counting up within its own series and rate() holds;
+    another worker's samples are at most one flush old. Files of exited workers are removed.
+    """
+    def __init__(self, root: str, registry: "Registry"):
+        self.root = root; self.registry = registry; os.makedirs(root, exist_ok=True)
+        self.path = os.path.join(root, f"{os.getpid()}.json")
+        registry.const_labels["worker"] = str(os.getpid())
+
+    def flush(self):
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix=".metrics-")
+        with os.fdopen(fd, "wb") as f: f.write(orjson.dumps(self.registry.collect()))
+        os.replace(tmp, self.path)
+
+    def close(self):
+        try: os.unlink(self.path)
+        except OSError: pass
+
+    def _others(self) -> Iterable[List[Family]]:
+        for path in glob.glob(os.path.join(self.root, "*.json")):
+            if path == self.path: continue
+            try: os.kill(int(os.path.basename(path)[:-5]), 0)
+            except ProcessLookupError:
+                try: os.unlink(path)
+                except OSError: pass
+                continue
+            except (ValueError, OSError): pass
+            try:
+                with open(path, "rb") as f: yield orjson.loads(f.read())
+            except (OSError, ValueError): continue
+
+    def render(self) -> str:
+        return self.registry.render(self._others())
+
+REGISTRY = Registry()
+
+SEARCH_SECONDS = REGISTRY.histogram("unifinder_search_seconds", "Time spent per search call (first page or next page).", ["mode"])
+SEARCH_RESULTS = REGISTRY.histogram("unifinder_search_results", "Rows returned per search.", ["mode"], COUNT_BUCKETS)
+FIND_SECONDS = REGISTRY.histogram("unifinder_find_seconds", "GET /find latency including serialization.", ["mode"])
+WEBHOOK_SECONDS = REGISTRY.histogram("unifinder_webhook_seconds", "Update latency from webhook arrival until handled.", ["outcome"])
+LOAD_SECONDS = REGISTRY.histogram("unifinder_load_seconds", "Dataset refresh duration by outcome.", ["outcome"], LOAD_BUCKETS)
@@ -0,0 +1,147 @@
+import io, os, sys, time, asyncio, cProfile, pstats, threading
+from collections import Counter
+from typing import Callable, Dict, List, Optional
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", ".cache/profiles")
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "300") or "300")
+SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005") or "0.005")
+MODES = ("cprofile", "sample")
+SUMMARY_LINES = 40
+
+def frame_stack(frame) -> List[str]:
+    names = []
+    while frame is not None:
+        co = frame.f_code
+        names.append(f"{co.co_name} ({os.path.basename(co.co_filename)}:{co.co_firstlineno})"); frame = frame.f_back
+    names.reverse()
+    return names
+
+class Sampler:
+    """Stacks of every other thread, sampled from a background thread and folded into collapsed-stack counts."""
+    def __init__(self, interval: float=SAMPLE_INTERVAL):
+        self.interval = interval; self.stacks: Counter = Counter(); self.samples = 0
+        self._stop = threading.Event(); self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True); self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None: self._thread.join(); self._thread = None
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for tid, frame in sys._current_frames().items():
+                if tid != me: self.stacks[";".join([names.get(tid, str(tid))] + frame_stack(frame))] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        """`thread;outer;...;inner count` lines, as read by flamegraph.pl and speedscope."""
+        return "".join(f"{stack} {n}\n" for stack, n in self.stacks.most_common())
+
+    def summary(self, lines: int=SUMMARY_LINES) -> str:
+        own = Counter()
+        for stack, n in self.stacks.items(): own[stack.rsplit(";", 1)[-1]] += n
+        total = sum(own.values()) or 1
+        return "\n".join([f"{self.samples} samples every {self.interval*1e3:g} ms; innermost frames:"]
+                         + [f"{n*100/total:6.2f}% {name}" for name, n in own.most_common(lines)])
+
+class Report:
+    """Finished capture: files on disk by format, and a short text summary."""
+    def __init__(self, mode: str, seconds: float, requests: int, files: Dict[str, str], summary: str):
+        self.mode = mode; self.seconds = seconds; self.requests = requests; self.files = files; self.summary = summary
+
+    def title(self) -> str:
+        return f"{self.mode}: {self.seconds:.1f} s, {self.requests} requests, worker {os.getpid()}"
+
+class Session:
+    def __init__(self, mode: str, seconds: float, requests: int):
+        self.mode = mode; self.seconds = seconds; self.requests = requests; self.seen = 0
+        self.started = time.perf_counter()
+        # millisecond resolution: captures stopped by a request count can start within the same second
+        now = time.time(); self.wall = time.strftime("%Y%m%d-%H%M%S", time.localtime(now)) + f"-{int(now*1000)%1000:03d}"
+        self.profile: Optional[cProfile.Profile] = None; self.sampler: Optional[Sampler] = None
+        self.thread_profiles: List[cProfile.Profile] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.done = asyncio.Event(); self.report: Optional[Report] = None
+
+class Profiler:
+    """One on-demand capture at a time, ended after `seconds` or `requests` counted requests, whichever comes first.
+
+    cprofile traces the event loop thread (handlers, search, formatting, webhook dispatch) plus functions run
+    through threaded(); sample takes stacks of all threads. While no capture runs, hooks cost one attribute check.
+    A capture covers only its own process: with several workers, the one that received the request.
+    """
+    def __init__(self, root: str=PROFILE_DIR, max_seconds: float=PROFILE_MAX_SECONDS):
+        self.root = root; self.max_seconds = max_seconds
+        self.session: Optional[Session] = None
+
+    def start(self, mode: str="cprofile", seconds: Optional[float]=None, requests: int=0) -> Session:
+        """Starts a capture; must be called on the event loop thread."""
+        if mode not in MODES: raise ValueError(f"unknown profile mode {mode!r}, expected one of {', '.join(MODES)}")
+        if self.session is not None: raise RuntimeError("profiling is already running")
+        seconds = min(seconds or self.max_seconds, self.max_seconds)
+        s = Session(mode, seconds, max(0, requests))
+        if mode == "cprofile":
+            s.profile = cProfile.Profile(); s.profile.enable()
+        else:
+            s.sampler = Sampler(); s.sampler.start()
+        s.timer = asyncio.get_running_loop().call_later(seconds, self.stop)
+        self.session = s
+        return s
+
+    def count(self):
+        """Marks one request handled; callers check `session is not None` first so the off path stays free."""
+        s = self.session
+        if s is None: return
+        s.seen += 1
+        if s.requests and s.seen >= s.requests: self.stop()
+
+    def threaded(self, fn: Callable) -> Callable:
+        """fn itself, or while a cprofile capture runs, fn traced by its own profiler (cProfile is per thread)."""
+        s = self.session
+        if s is None or s.profile is None: return fn
+        def traced(*args, **kw):
+            p = cProfile.Profile()
+            try: return p.runcall(fn, *args, **kw)
+            finally: s.thread_profiles.append(p)
+        return traced
+
+    def stop(self) -> Optional[Report]:
+        s = self.session
+        if s is None: return None
+        self.session = None
+        if s.timer is not None: s.timer.cancel()
+        elapsed = time.perf_counter() - s.started
+        os.makedirs(self.root, exist_ok=True)
+        stem = base = os.path.join(self.root, f"profile-{s.wall}-{os.getpid()}-{s.mode}"); k = 1
+        while os.path.exists(base + ".txt") or os.path.exists(base + ".collapsed.txt"):
+            k += 1; base = f"{stem}-{k}"
+        if s.profile is not None:
+            s.profile.disable()
+            stats = pstats.Stats(s.profile)
+            for p in s.thread_profiles:
+                try: stats.add(p)
+                except TypeError: pass  # a thread profile that recorded no calls
+            stats.dump_stats(base + ".pstats")
+            buf = io.StringIO(); stats.stream = buf
+            stats.sort_stats("cumulative").print_stats(SUMMARY_LINES)
+            summary = buf.getvalue().strip()
+            with open(base + ".txt", "w", encoding="utf-8") as f: f.write(summary + "\n")
+            files = {"pstats": base + ".pstats", "text": base + ".txt"}
+        else:
+            s.sampler.stop()
+            with open(base + ".collapsed.txt", "w", encoding="utf-8") as f: f.write(s.sampler.collapsed())
+            summary = s.sampler.summary()
+            files = {"collapsed": base + ".collapsed.txt"}
+        s.report = Report(s.mode, elapsed, s.seen, files, summary); s.done.set()
+        return s.report
+
+    async def capture(self, mode: str="cprofile", seconds: Optional[float]=None, requests: int=0) -> Report:
+        s = self.start(mode, seconds, requests)
+        await s.done.wait()
+        return s.report
+
+PROFILER = Profiler()
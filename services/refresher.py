@@ -0,0 +1,43 @@
+import asyncio
+from typing import Awaitable, Callable, Optional
+
+class Refresher:
+    """Runs dataset loads in the background, at most one at a time.
+
+    Every trigger (startup, TTL tick, /refresh) joins the load already in flight instead of starting another.
+    """
+    def __init__(self, load: Callable[[], Awaitable[object]], ttl: int, on_error: Optional[Callable[[Exception], None]]=None):
+        self._load = load; self.ttl = ttl; self._on_error = on_error
+        self._inflight: Optional[asyncio.Future] = None
+        self._task: Optional[asyncio.Task] = None
+        self.loads = 0; self.coalesced = 0
+
+    async def _run_once(self):
+        try:
+            self.loads += 1
+            return await self._load()
+        except Exception as e:
+            if self._on_error: self._on_error(e)
+            return None
+
+    def trigger(self) -> asyncio.Future:
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.ensure_future(self._run_once())
+        else:
+            self.coalesced += 1
+        return self._inflight
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.ttl)
+            await self.trigger()
+
+    def start(self):
+        if self.ttl > 0 and self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel(); self._task = None
+        if self._inflight is not None and not self._inflight.done():
+            await asyncio.wait([self._inflight])
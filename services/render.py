@@ -0,0 +1,59 @@
+from typing import Any, Dict, Iterable, List, Optional
+import orjson
+
+# rows per /topdifficulty answer; the first page of every leaderboard view is rendered with the State
+TOP_PAGE = 20
+
+def rating_label(r) -> str:
+    src = r.get("rating_source") or ""
+    year = r.get("rating_year") or ""
+    pos = r.get("rating_position")
+    return f"{src} {year} #{pos}" if src and year and pos else ""
+
+def find_line(r) -> str:
+    rating = rating_label(r)
+    return f"• <b>{r.get('university') or '-'}</b> — {r.get('city') or '-'}{' | '+rating if rating else ''}"
+
+def top_line(r) -> str:
+    """A /topdifficulty line without its position number, which depends on the filters."""
+    return f"<b>{r.get('university') or '-'}</b> — {r.get('city') or '-'} | {rating_label(r)} | idx: {r.get('difficulty_index')}"
+
+class Fragments:
+    """Serialized pieces of each row for one dataset version: JSON bytes for /find and the bot's HTML lines.
+
+    A piece is built the first time its row is shown and kept by row id until the State is replaced, so
+    responses are assembled by joining cached pieces instead of serializing rows per request. The
+    /topdifficulty lines of every leaderboard's first page are built with the State (warm_top).
+    """
+    __slots__ = ("data", "_json", "_find", "_top")
+
+    def __init__(self, data):
+        self.data = data
+        self._json: Dict[int, bytes] = {}
+        self._find: Dict[int, str] = {}
+        self._top: Dict[int, str] = {}
+
+    def json(self, i: int) -> bytes:
+        b = self._json.get(i)
+        if b is None: b = self._json[i] = orjson.dumps(self.data[i].to_dict())
+        return b
+
+    def find_line(self, i: int) -> str:
+        s = self._find.get(i)
+        if s is None: s = self._find[i] = find_line(self.data[i])
+        return s
+
+    def top_line(self, i: int) -> str:
+        s = self._top.get(i)
+        if s is None: s = self._top[i] = top_line(self.data[i])
+        return s
+
+    def warm_top(self, ids: Iterable[int]):
+        """Builds the top lines of `ids` up front, so the first page of a leaderboard is never cold."""
+        for i in ids: self.top_line(i)
+
+def json_page(fragments: Fragments, ids: List[int], extra: Optional[Dict[str, Any]]=None) -> bytes:
+    """`{"count": n, "items": [...], **extra}` built from cached row bytes."""
+    body = b'{"count":%d,"items":[%b]' % (len(ids), b",".join([fragments.json(i) for i in ids]))
+    for k, v in (extra or {}).items(): body += b",%b:%b" % (orjson.dumps(k), orjson.dumps(v))
+    return body + b"}"
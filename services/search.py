@@ -1,15 +1,197 @@
-from typing import Dict, Any, List
+from array import array
+from time import perf_counter
+from itertools import islice
+from typing import Callable, Dict, Any, List, Iterator, Optional, Tuple
+from services.store import Dataset, Strings
+from services.fuzzy import FuzzyIndex
+from services.leaderboard import Leaderboards
+from services.suggest import PrefixIndex, fold_prefix
+from services.cache import QueryCache
+from services.facets import FacetIndex, FacetFilter, Selection, intersect
+from services.metrics import SEARCH_SECONDS, SEARCH_RESULTS
 
 SEARCH_FIELDS = ["university","city","program","code","rating_source","rating_year","rating_position"]
+_TIME = {m: SEARCH_SECONDS.labels(m) for m in ("exact", "fuzzy", "prefix")}
+_COUNT = {m: SEARCH_RESULTS.labels(m) for m in ("exact", "fuzzy", "prefix")}
+# fuzzy pages are sliced from a ranking computed this many rows at a time, so paging does not re-rank
+FUZZY_WINDOW = 100
 
-def search_items(data: List[Dict[str, Any]], query: str, limit: int=20) -> List[Dict[str, Any]]:
+def haystack(row: Dict[str, Any]) -> str:
+    return " ".join(str(row.get(k,"")) for k in SEARCH_FIELDS).lower()
+
+def haystacks(data) -> List[str]:
+    if isinstance(data, Dataset):
+        cols = [data.values(k) for k in SEARCH_FIELDS]
+        return [" ".join("" if v is None else str(v) for v in vals).lower() for vals in zip(*cols)]
+    return [haystack(r) for r in data]
+
+def trigrams(s: str) -> set:
+    return {s[i:i+3] for i in range(len(s)-2)}
+
+class SearchIndex:
+    """Trigram -> row id posting lists over the same haystack `search_items` matches against."""
+    __slots__ = ("hay", "postings")
+
+    def __init__(self, data: List[Dict[str, Any]]):
+        self.hay: List[str] = haystacks(data)
+        post: Dict[str, array] = {}
+        for i, h in enumerate(self.hay):
+            for g in trigrams(h):
+                p = post.get(g)
+                if p is None: p = post[g] = array("I")
+                p.append(i)
+        self.postings = post
+
+    def __len__(self) -> int:
+        return len(self.hay)
+
+    def candidates(self, q: str, start: int=0) -> Iterator[int]:
+        if len(q) < 3:
+            # a mapped haystack is searched in its raw bytes rather than decoded row by row
+            return self.hay.scan(q, start) if isinstance(self.hay, Strings) else iter(range(start, len(self.hay)))
+        lists = []
+        for g in trigrams(q):
+            p = self.postings.get(g)
+            if p is None: return iter(())
+            lists.append(p)
+        lists.sort(key=len)
+        return intersect(lists, start)
+
+    def estimate(self, q: str) -> int:
+        """Upper bound on candidates(q): the shortest posting list among the query's trigrams."""
+        if len(q) < 3: return len(self.hay)
+        return min((len(self.postings.get(g, ())) for g in trigrams(q)), default=len(self.hay))
+
+    def find(self, q: str, limit: int=20, after: int=-1, keep: Optional[Callable[[int], bool]]=None) -> List[int]:
+        """Ids of up to `limit` matching rows, in row order, starting after row id `after`;
+        with `keep` (a facets Selection.has) only the rows it accepts."""
+        hay = self.hay; out: List[int] = []
+        if limit <= 0:
+            return [i for i in self.candidates(q, after+1) if q in hay[i] and (keep is None or keep(i))][:limit]
+        for i in self.candidates(q, after+1):
+            if q in hay[i] and (keep is None or keep(i)):
+                out.append(i)
+                if len(out) >= limit: break
+        return out
+
+def search_ids(data: List[Dict[str, Any]], q: str, limit: int=20, index: Optional[SearchIndex]=None, after: int=-1,
+               sel: Optional[Selection]=None) -> List[int]:
+    if sel is not None: return filtered_ids(data, q, limit, index, after, sel)
+    if index is not None and len(index) == len(data):
+        return index.find(q, limit, after)
+    if limit <= 0: return [i for i in range(after+1, len(data)) if q in haystack(data[i])][:limit]
+    out: List[int] = []
+    for i in range(after+1, len(data)):
+        if q in haystack(data[i]):
+            out.append(i)
+            if len(out) >= limit: break
+    return out
+
+def facet_selection(data: List[Dict[str, Any]], flt: Optional[FacetFilter], facets: Optional[FacetIndex]=None) -> Optional[Selection]:
+    """Rows matching flt for search_page/ranked_page, or None when nothing is filtered."""
+    if not flt: return None
+    if facets is None or len(facets) != len(data): facets = FacetIndex(data)
+    return facets.select(flt)
+
+def filtered_ids(data: List[Dict[str, Any]], q: str, limit: int, index: Optional[SearchIndex], after: int, sel: Selection) -> List[int]:
+    # whichever side is smaller drives: trigram candidates tested against the facet mask, or facet rows tested for the text
+    if limit <= 0: return []
+    if not q: return list(islice(sel.rows(after+1), limit))
+    if index is not None and len(index) == len(data):
+        if index.estimate(q) < sel.estimate(): return index.find(q, limit, after, sel.has)
+        match = lambda i: q in index.hay[i]
+    else:
+        match = lambda i: q in haystack(data[i])
+    return list(islice(filter(match, sel.rows(after+1)), limit))
+
+def _observed(mode: str, t: float, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    _TIME[mode].observe(perf_counter() - t); _COUNT[mode].observe(len(items))
+    return items
+
+def search_items(data: List[Dict[str, Any]], query: str, limit: int=20, index: Optional[SearchIndex]=None,
+                 cache: Optional[QueryCache]=None, version: Any=None) -> List[Dict[str, Any]]:
     q = (query or "").lower().strip()
     if not q: return []
-    def match(row: Dict[str, Any]) -> bool:
-        hay = " ".join(str(row.get(k,"")) for k in SEARCH_FIELDS).lower()
-        return q in hay
-    return [r for r in data if match(r)][:limit]
+    t = perf_counter()
+    ids = search_ids(data, q, limit, index) if cache is None else cache.ids("exact", q, limit, version, lambda: search_ids(data, q, limit, index))
+    return _observed("exact", t, [data[i] for i in ids])
+
+def search_ranked(data: List[Dict[str, Any]], query: str, limit: int=20, fuzzy: Optional[FuzzyIndex]=None,
+                  cache: Optional[QueryCache]=None, version: Any=None) -> List[Dict[str, Any]]:
+    if not (query or "").strip(): return []
+    if fuzzy is None: fuzzy = FuzzyIndex(data)
+    t = perf_counter()
+    ids = fuzzy.find(query, limit) if cache is None else cache.ids("fuzzy", query, limit, version, lambda: fuzzy.find(query, limit))
+    return _observed("fuzzy", t, [data[i] for i in ids])
+
+def search_page(data: List[Dict[str, Any]], query: str, limit: int=20, index: Optional[SearchIndex]=None,
+                cache: Optional[QueryCache]=None, version: Any=None, after: int=-1, offset: int=0,
+                sel: Optional[Selection]=None) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    """Exact matches in row order: `limit` rows after row id `after` (and past `offset` more matches), plus the
+    cursor for the next page, None on the last one. Matching stops one row past the page.
+    With a facet selection only its rows match, and an empty query lists them all."""
+    q = (query or "").lower().strip()
+    if not q and sel is None or limit <= 0: return [], None
+    t = perf_counter(); after = max(after, -1)
+    filters = ("after",) if sel is None else ("after", sel.key)
+    def ids(n: int, start: int):
+        if cache is None: return search_ids(data, q, n, index, start, sel)
+        return cache.ids("exact", q, n, version, lambda: search_ids(data, q, n, index, start, sel), filters + (start,))
+    if offset > 0:
+        skipped = ids(offset, after)
+        if len(skipped) < offset: return _observed("exact", t, []), None
+        after = skipped[-1]
+    found = ids(limit+1, after)
+    page = found[:limit]
+    return _observed("exact", t, [data[i] for i in page]), page[-1] if len(found) > limit else None
+
+def ranked_ids(fuzzy: FuzzyIndex, query: str, n: int, sel: Optional[Selection]=None) -> List[int]:
+    """Top `n` fuzzy matches, only among the selection's rows when given (the ranking is widened until n pass)."""
+    if sel is None: return fuzzy.find(query, n)
+    m = n
+    while True:
+        ids = fuzzy.find(query, m); out = sel.keep(ids)
+        if len(out) >= n or len(ids) < m: return out[:n]
+        m *= 4
+
+def ranked_page(data: List[Dict[str, Any]], query: str, limit: int=20, fuzzy: Optional[FuzzyIndex]=None,
+                cache: Optional[QueryCache]=None, version: Any=None, offset: int=0,
+                sel: Optional[Selection]=None) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    """Fuzzy matches by rank from `offset`, plus the next page's offset (None on the last page)."""
+    if not (query or "").strip() or limit <= 0: return [], None
+    if fuzzy is None: fuzzy = FuzzyIndex(data)
+    t = perf_counter(); offset = max(offset, 0)
+    n = -(-(offset+limit+1)//FUZZY_WINDOW)*FUZZY_WINDOW
+    if cache is None: ids = ranked_ids(fuzzy, query, n, sel)
+    else: ids = cache.ids("fuzzy", query, n, version, lambda: ranked_ids(fuzzy, query, n, sel), () if sel is None else sel.key)
+    end = offset+limit
+    return _observed("fuzzy", t, [data[i] for i in ids[offset:end]]), end if len(ids) > end else None
+
+def suggest_items(data: List[Dict[str, Any]], query: str, limit: int=20, prefix: Optional[PrefixIndex]=None,
+                  cache: Optional[QueryCache]=None, version: Any=None) -> List[Dict[str, Any]]:
+    """Autocomplete: one row per university whose name, abbreviation or city starts with what was typed."""
+    if prefix is None: prefix = PrefixIndex(data)
+    t = perf_counter(); p = fold_prefix(query)
+    ids = prefix.find(p, limit) if cache is None else cache.ids("prefix", p, limit, version, lambda: prefix.find(p, limit))
+    return _observed("prefix", t, [data[i] for i in ids])
+
+def encode_cursor(version: Any, pos: int) -> str:
+    return f"{version}.{pos}"
+
+def decode_cursor(cursor: str, version: Any, minimum: int=-1) -> int:
+    """Position stored in a cursor; ValueError when it is malformed, below `minimum` (-1 for row ids,
+    0 for rank offsets) or from another dataset version."""
+    v, _, pos = cursor.rpartition(".")
+    if not v or not pos.lstrip("-").isdigit() or int(pos) < minimum: raise ValueError("malformed cursor")
+    if v != str(version): raise ValueError("cursor expired: the dataset was reloaded, start the search again")
+    return int(pos)
 
-def top_by_difficulty(data: List[Dict[str, Any]], n: int=20) -> List[Dict[str, Any]]:
+def top_by_difficulty(data: List[Dict[str, Any]], n: int=20, boards: Optional[Leaderboards]=None,
+                      source: Optional[str]=None, year: Optional[int]=None, city: Optional[str]=None) -> List[Dict[str, Any]]:
+    if boards is not None and len(boards) == len(data):
+        return [data[i] for i in boards.top(n, source, year, city)]
+    if source or year is not None or city:
+        boards = Leaderboards(data if isinstance(data, Dataset) else Dataset.from_rows(data))
+        return [data[i] for i in boards.top(n, source, year, city)]
     def key(r): return (-int(r.get("difficulty_index",0) or 0), int(r.get("rating_position", 10**9)))
     return sorted(data, key=key)[:n]
@@ -0,0 +1,92 @@
+import os, glob, time, fcntl, tempfile
+from typing import Any, Dict, Optional
+import orjson
+
+from services.state import State
+from services.snapshot import write_snapshot, load_snapshot
+
+POINTER = "current.json"
+LOCK = "refresher.lock"
+REFRESH_REQUEST = "refresh.request"
+# snapshots kept besides the current one, so a worker still switching over never finds its file gone
+KEEP_PREVIOUS = 1
+
+class SharedDataset:
+    """Dataset shared by the workers of one host through snapshot files in `root`.
+
+    Whoever holds an exclusive flock on root/refresher.lock is the refresher: it alone fetches upstream,
+    writes each new State as a snapshot and atomically repoints root/current.json at it. Every worker,
+    the refresher included, serves the memory-mapped snapshot, so the columns, string tables and indexes live
+    once in the page cache however many workers run. The lock is dropped when its process exits, and the
+    next worker to poll takes over.
+    """
+    def __init__(self, root: str):
+        self.root = root; os.makedirs(root, exist_ok=True)
+        self._lock_fd: Optional[int] = None
+        self.current: Optional[str] = None; self.version = 0
+        self._refresh_seen = time.time()
+
+    @property
+    def leader(self) -> bool:
+        return self._lock_fd is not None
+
+    def try_lead(self) -> bool:
+        if self._lock_fd is not None: return True
+        fd = os.open(os.path.join(self.root, LOCK), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd); return False
+        os.ftruncate(fd, 0); os.write(fd, str(os.getpid()).encode())
+        self._lock_fd = fd
+        return True
+
+    def pointer(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(os.path.join(self.root, POINTER), "rb") as f: return orjson.loads(f.read())
+        except (OSError, ValueError):
+            return None
+
+    def publish(self, state: State) -> State:
+        """Refresher only: writes state as the next version and returns it reloaded from the shared mapping."""
+        version = max(self.version, (self.pointer() or {}).get("version", 0)) + 1
+        name = f"data-{version:08d}-{time.time_ns()}.snap"
+        write_snapshot(os.path.join(self.root, name), state, {"shared_version": version})
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix=".pointer-")
+        with os.fdopen(fd, "wb") as f: f.write(orjson.dumps({"file": name, "version": version, "pid": os.getpid()}))
+        os.replace(tmp, os.path.join(self.root, POINTER))
+        shared = self.attach({"file": name, "version": version}, state)
+        self._prune()
+        return shared
+
+    def attach(self, ptr: Dict[str, Any], prev: Optional[State]=None) -> State:
+        """Maps the snapshot `ptr` names; the state takes the published version so every worker agrees on it."""
+        # the writer already hashed it and the pointer only moves after an atomic rename
+        state = load_snapshot(os.path.join(self.root, ptr["file"]), prev, verify=False)
+        state.version = ptr["version"]; self.current = ptr["file"]; self.version = ptr["version"]
+        return state
+
+    def changed(self) -> Optional[Dict[str, Any]]:
+        """The pointer when it names a snapshot this worker does not serve yet."""
+        ptr = self.pointer()
+        return ptr if ptr and ptr.get("file") != self.current else None
+
+    def _prune(self):
+        files = sorted(glob.glob(os.path.join(self.root, "data-*.snap")))
+        for path in files[:-(KEEP_PREVIOUS+1)]:
+            try: os.unlink(path)  # workers that still map it keep their pages until they switch
+            except OSError: pass
+
+    def request_refresh(self):
+        """Asks the refresher, whichever worker it is, to reload on its next poll."""
+        with open(os.path.join(self.root, REFRESH_REQUEST), "w") as f: f.write(str(time.time()))
+
+    def refresh_requested(self) -> bool:
+        try: m = os.stat(os.path.join(self.root, REFRESH_REQUEST)).st_mtime
+        except OSError: return False
+        if m <= self._refresh_seen: return False
+        self._refresh_seen = m
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {"dir": self.root, "pid": os.getpid(), "leader": self.leader, "version": self.version, "file": self.current}
@@ -0,0 +1,223 @@
+"""Binary dataset snapshot: rows plus the prebuilt search, fuzzy, leaderboard, autocomplete and facet indexes.
+
+Layout (header little-endian; int sections in the writer's byte order, recorded in the toc):
+
+    header   MAGIC | format version u32 | flags u32 | body length u64 | sha256(body)
+    body     toc length u64 | toc (JSON) | sections, each 8-byte aligned
+
+Every section is read straight out of the mmap: int sections as memoryviews, string sections as
+Strings (a utf-8 blob plus an offsets array, decoded one item at a time) and posting lists as
+Postings over sorted keys. Attaching a snapshot allocates next to nothing per process; only the
+rare JSON sections (columns mixing types) are decoded.
+"""
+import os, sys, mmap, struct, hashlib, tempfile
+from bisect import bisect_left
+from collections.abc import Mapping
+from array import array
+from datetime import datetime
+from typing import Dict, Any, List, Tuple, Optional, Sequence, Iterator
+import orjson
+
+from services.store import Dataset, CodedColumn, Strings, INT_COLUMNS
+from services.search import SearchIndex
+from services.fuzzy import FuzzyIndex
+from services.leaderboard import Leaderboards, MappedLeaderboards
+from services.suggest import PrefixIndex
+from services.facets import FacetIndex
+from services.state import State
+from services.render import TOP_PAGE
+
+MAGIC = b"UFSNAP\x00\x01"
+FORMAT_VERSION = 3
+HEADER = struct.Struct("<8sIIQ32s")
+_U64 = struct.Struct("<Q")
+
+class SnapshotError(Exception):
+    pass
+
+class Ragged:
+    """Sequence of int sequences over one flat array and an offsets array (len+1)."""
+    __slots__ = ("flat", "offsets")
+
+    def __init__(self, flat, offsets):
+        self.flat = flat; self.offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.flat[self.offsets[i]:self.offsets[i+1]]
+
+class Postings(Mapping):
+    """Read-only str -> row id list mapping over sorted Strings keys and a Ragged; a lookup bisects the keys."""
+    __slots__ = ("_keys", "_lists")
+
+    def __init__(self, keys: Strings, lists: Ragged):
+        self._keys = keys; self._lists = lists
+
+    def __getitem__(self, k: str):
+        keys = self._keys; i = bisect_left(keys, k)
+        if i == len(keys) or keys[i] != k: raise KeyError(k)
+        return self._lists[i]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+def _ragged(seqs) -> Tuple[array, array]:
+    flat = array("I"); offsets = array("Q", [0])
+    for s in seqs:
+        flat.extend(s); offsets.append(len(flat))
+    return flat, offsets
+
+class _Writer:
+    def __init__(self):
+        self.toc: Dict[str, Any] = {}; self.chunks: List[bytes] = []; self.size = 0
+
+    def _add(self, name: str, kind: str, data: bytes, **extra):
+        pad = -self.size % 8
+        if pad: self.chunks.append(b"\0"*pad); self.size += pad
+        self.toc[name] = {"kind": kind, "offset": self.size, "length": len(data), **extra}
+        self.chunks.append(data); self.size += len(data)
+
+    def ints(self, name: str, a):
+        if isinstance(a, memoryview): self._add(name, "a", a.tobytes(), typecode=a.format); return
+        a = a if isinstance(a, array) else array("i" if min(a, default=0) < 0 else "I", a)
+        self._add(name, "a", a.tobytes(), typecode=a.typecode)
+
+    def strings(self, name: str, items: Sequence[str]):
+        blob = bytearray(); offsets = array("Q", [0])
+        for s in items:
+            blob += s.encode("utf-8"); offsets.append(len(blob))
+        self._add(name, "s", bytes(blob)); self.ints(name+":offsets", offsets)
+
+    def json(self, name: str, obj):
+        self._add(name, "j", orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS))
+
+    def ragged(self, name: str, seqs):
+        flat, offsets = _ragged(seqs)
+        self.ints(name+":flat", flat); self.ints(name+":offsets", offsets)
+
+    def postings(self, name: str, post: Dict[str, Sequence[int]]):
+        keys = sorted(post)  # so Postings can bisect
+        self.strings(name+":keys", keys); self.ragged(name, (post[k] for k in keys))
+
+def write_snapshot(path: str, state: State, meta: Optional[Dict[str, Any]]=None):
+    ds = state.data; w = _Writer()
+    for k in ds.fields:
+        col = ds.columns[k]
+        if type(col) in INT_COLUMNS:
+            w.ints("col:"+k, col)
+        elif all(v is None or type(v) is str for v in col):
+            table: Dict[str, int] = {}
+            codes = array("i", (-1 if v is None else table.setdefault(v, len(table)) for v in col))
+            w.ints("col:"+k+":codes", codes); w.strings("col:"+k+":table", list(table))
+        else:
+            w.json("col:"+k, list(col))
+    index = state.index or SearchIndex(ds)
+    w.strings("index:hay", index.hay); w.postings("index:postings", index.postings)
+    fz = state.fuzzy or FuzzyIndex(ds)
+    w.strings("fuzzy:vocab", fz.vocab); w.ints("fuzzy:vocab_grams", fz.vocab_grams)
+    w.postings("fuzzy:gram_postings", fz.gram_postings)
+    w.ragged("fuzzy:token_docs", fz.token_docs); w.ragged("fuzzy:doc_tokens", fz.doc_tokens)
+    w.ints("fuzzy:doc_len", fz.doc_len); w.ragged("fuzzy:doc_rows", fz.doc_rows)
+    boards = state.boards if len(state.boards) == len(ds) else Leaderboards(ds)
+    all_ids, views = boards.orderings(); keys = list(views)
+    w.ints("boards:all", all_ids); w.json("boards:view_keys", keys); w.ragged("boards:views", (views[k] for k in keys))
+    px = state.prefix or PrefixIndex(ds)
+    w.strings("prefix:keys", px.keys); w.ints("prefix:key_docs", px.key_docs); w.ints("prefix:key_score", px.key_score)
+    w.ints("prefix:doc_rows", px.doc_rows); w.postings("prefix:top", px.top)
+    fx = state.facets if state.facets is not None and len(state.facets) == len(ds) else FacetIndex(ds)
+    w.postings("facets:city", fx.city); w.postings("facets:source", fx.source)
+    years = list(fx.year); w.json("facets:year:keys", years); w.ragged("facets:year", (fx.year[y] for y in years))
+    w.ints("facets:diff_order", fx.diff_order); w.ints("facets:diff_values", fx.diff_values); w.ints("facets:diff_rank", fx.diff_rank)
+    info = {"rows": len(ds), "fields": ds.fields, "byteorder": sys.byteorder,
+            "created": datetime.utcnow().isoformat(), **(meta or {})}
+    toc = orjson.dumps({"meta": info, "sections": w.toc})
+    body_head = _U64.pack(len(toc)) + toc
+    pad = -len(body_head) % 8; body_head += b"\0"*pad
+    digest = hashlib.sha256(body_head)
+    for c in w.chunks: digest.update(c)
+    d = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=d, prefix=".snapshot-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0, len(body_head) + w.size, digest.digest()))
+            f.write(body_head)
+            for c in w.chunks: f.write(c)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp): os.unlink(tmp)
+        raise
+
+class _Reader:
+    def __init__(self, mm: mmap.mmap, verify: bool):
+        if len(mm) < HEADER.size: raise SnapshotError("file too short")
+        magic, version, _flags, length, digest = HEADER.unpack_from(mm, 0)
+        if magic != MAGIC: raise SnapshotError("not a dataset snapshot")
+        if version != FORMAT_VERSION: raise SnapshotError(f"unsupported snapshot version {version}")
+        if len(mm) != HEADER.size + length: raise SnapshotError("truncated snapshot")
+        self.body = memoryview(mm)[HEADER.size:]
+        if verify and hashlib.sha256(self.body).digest() != digest: raise SnapshotError("checksum mismatch")
+        (toc_len,) = _U64.unpack_from(self.body, 0)
+        toc = orjson.loads(self.body[8:8+toc_len])
+        self.meta = toc["meta"]; self.sections = toc["sections"]
+        if self.meta.get("byteorder") != sys.byteorder: raise SnapshotError("snapshot byte order differs")
+        self.base = 8 + toc_len + (-(8 + toc_len) % 8)
+
+    def _raw(self, name: str):
+        s = self.sections.get(name)
+        if s is None: raise SnapshotError(f"missing section {name}")
+        off = self.base + s["offset"]
+        return s, self.body[off:off+s["length"]]
+
+    def has(self, name: str) -> bool:
+        return name in self.sections
+
+    def get(self, name: str):
+        s, raw = self._raw(name)
+        if s["kind"] == "a": return raw.cast(s["typecode"])
+        if s["kind"] == "s": return Strings(raw, self.get(name+":offsets"))
+        return orjson.loads(raw)
+
+    def ragged(self, name: str) -> Ragged:
+        return Ragged(self.get(name+":flat"), self.get(name+":offsets"))
+
+    def postings(self, name: str) -> Postings:
+        return Postings(self.get(name+":keys"), self.ragged(name))
+
+def load_snapshot(path: str, prev: Optional[State]=None, verify: bool=True) -> State:
+    """Memory-maps a snapshot written by write_snapshot and returns it as the next State."""
+    with open(path, "rb") as f:
+        try: mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError: raise SnapshotError("empty file")
+    r = _Reader(mm, verify)
+    fields = [sys.intern(k) for k in r.meta["fields"]]; columns = {}
+    for k in fields:
+        if r.has("col:"+k+":codes"):
+            columns[k] = CodedColumn(r.get("col:"+k+":codes"), r.get("col:"+k+":table"))
+        else:
+            columns[k] = r.get("col:"+k)
+    ds = Dataset.from_columns(fields, columns, r.meta["rows"])
+    index = SearchIndex.__new__(SearchIndex)
+    index.hay = r.get("index:hay"); index.postings = r.postings("index:postings")
+    fz = FuzzyIndex.__new__(FuzzyIndex)
+    fz.vocab = r.get("fuzzy:vocab"); fz.vocab_grams = r.get("fuzzy:vocab_grams")
+    fz.gram_postings = r.postings("fuzzy:gram_postings")
+    fz.token_docs = r.ragged("fuzzy:token_docs"); fz.doc_tokens = r.ragged("fuzzy:doc_tokens")
+    fz.doc_len = r.get("fuzzy:doc_len"); fz.doc_rows = r.ragged("fuzzy:doc_rows")
+    views = r.ragged("boards:views")
+    boards = MappedLeaderboards(ds, r.get("boards:all"), {tuple(k): views[i] for i, k in enumerate(r.get("boards:view_keys"))})
+    px = PrefixIndex.__new__(PrefixIndex)
+    px.keys = r.get("prefix:keys"); px.key_docs = r.get("prefix:key_docs"); px.key_score = r.get("prefix:key_score")
+    px.doc_rows = r.get("prefix:doc_rows"); px.top = r.postings("prefix:top")
+    fx = FacetIndex.__new__(FacetIndex); fx.n = len(ds)
+    fx.city = r.postings("facets:city"); fx.source = r.postings("facets:source")
+    years = r.ragged("facets:year"); fx.year = {y: years[i] for i, y in enumerate(r.get("facets:year:keys"))}
+    fx.diff_order = r.get("facets:diff_order"); fx.diff_values = r.get("facets:diff_values"); fx.diff_rank = r.get("facets:diff_rank")
+    prev = prev or State()
+    state = State(ds, index, fz, boards, prev.version+1, datetime.utcnow(), px, fx)
+    state.fragments.warm_top(boards.heads(TOP_PAGE))
+    return state
@@ -0,0 +1,32 @@
+from datetime import datetime
+from typing import Dict, Any, Iterable, Optional
+
+from services.store import Dataset
+from services.search import SearchIndex
+from services.fuzzy import FuzzyIndex
+from services.leaderboard import Leaderboards
+from services.suggest import PrefixIndex
+from services.render import Fragments, TOP_PAGE
+from services.facets import FacetIndex
+
+class State:
+    """One immutable dataset version with everything derived from it; swapped in as a whole."""
+    __slots__ = ("data", "index", "fuzzy", "boards", "version", "loaded_at", "prefix", "fragments", "facets")
+
+    def __init__(self, data: Optional[Dataset]=None, index: Optional[SearchIndex]=None, fuzzy: Optional[FuzzyIndex]=None,
+                 boards: Optional[Leaderboards]=None, version: int=0, loaded_at: Optional[datetime]=None,
+                 prefix: Optional[PrefixIndex]=None, facets: Optional[FacetIndex]=None):
+        self.data = data if data is not None else Dataset()
+        self.index = index; self.fuzzy = fuzzy
+        self.boards = boards if boards is not None else Leaderboards()
+        self.version = version; self.loaded_at = loaded_at
+        self.prefix = prefix; self.facets = facets
+        self.fragments = Fragments(self.data)
+
+def build_state(rows: Iterable[Dict[str, Any]], prev: Optional[State]=None) -> State:
+    prev = prev or State()
+    data = rows if isinstance(rows, Dataset) else Dataset.from_rows(rows)
+    state = State(data, SearchIndex(data), FuzzyIndex(data), prev.boards.refresh(data), prev.version+1, datetime.utcnow(),
+                  PrefixIndex(data), FacetIndex(data))
+    state.fragments.warm_top(state.boards.heads(TOP_PAGE))
+    return state
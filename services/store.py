@@ -0,0 +1,193 @@
+import sys
+from array import array
+from bisect import bisect_right
+from collections.abc import Mapping
+from typing import Dict, Any, List, Iterable, Iterator, Optional, Sequence
+
+INT_FIELDS = ("rating_year","rating_position","difficulty_index")
+NA = -2**31
+
+# int columns are arrays when built in memory and memoryviews over a mapped snapshot
+INT_COLUMNS = (array, memoryview)
+
+_NOT_INT = object()
+_MISSING = object()
+
+def _to_int(v):
+    if v is None or v == "": return None
+    if isinstance(v, bool): return _NOT_INT
+    if isinstance(v, int): return v if NA < v < 2**31 else _NOT_INT
+    try: f = float(v)
+    except (TypeError, ValueError): return _NOT_INT
+    if f != f: return None
+    if not NA < f < 2**31 or f != int(f): return _NOT_INT
+    return int(f)
+
+def _intern(v):
+    if type(v) is float and v != v: return None  # NaN from pandas means missing
+    return sys.intern(v) if type(v) is str else v
+
+class CodedColumn:
+    """Read-only string column stored as codes into a table of distinct values (-1 is null).
+    Over a snapshot the table is a Strings view into the mapping."""
+    __slots__ = ("codes", "table")
+
+    def __init__(self, codes, table: Sequence[str]):
+        self.codes = codes; self.table = table
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, i):
+        c = self.codes[i]
+        return None if c < 0 else self.table[c]
+
+    def __iter__(self) -> Iterator[Optional[str]]:
+        t = self.table
+        return (None if c < 0 else t[c] for c in self.codes)
+
+class Strings:
+    """Sequence of str over one utf-8 blob and an offsets array (len+1); items are decoded on access."""
+    __slots__ = ("blob", "offsets")
+
+    def __init__(self, blob, offsets):
+        self.blob = blob; self.offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        if i < 0: i += len(self.offsets) - 1
+        o = self.offsets
+        return str(self.blob[o[i]:o[i+1]], "utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        blob = self.blob; o = self.offsets
+        return (str(blob[o[i]:o[i+1]], "utf-8") for i in range(len(o)-1))
+
+    def scan(self, sub: str, start: int=0, window: int=1 << 16) -> Iterator[int]:
+        """Ids from `start` up of the items that may contain `sub`, found in the raw bytes a window at a time
+        instead of decoding every item. A match may straddle two items, so callers still test the item."""
+        o = self.offsets; s = sub.encode("utf-8"); n = len(o) - 1
+        if start >= n: return
+        pos = o[start]; end = o[n]
+        while pos < end:
+            k = bytes(self.blob[pos:pos+window+len(s)-1]).find(s)
+            if k < 0:
+                pos += window; continue
+            i = bisect_right(o, pos+k) - 1
+            yield i
+            pos = o[i+1]
+
+class Row(Mapping):
+    """Lightweight view over one row of a Dataset; missing and null values read as absent."""
+    __slots__ = ("_ds", "_i")
+
+    def __init__(self, ds: "Dataset", i: int):
+        self._ds = ds; self._i = i
+
+    def get(self, k, default=None):
+        col = self._ds.columns.get(k)
+        if col is None: return default
+        v = col[self._i]
+        if v is None or v == NA and type(col) in INT_COLUMNS: return default
+        return v
+
+    def __getitem__(self, k):
+        v = self.get(k, _MISSING)
+        if v is _MISSING: raise KeyError(k)
+        return v
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
+
+    def __len__(self) -> int:
+        return len(self.keys())
+
+    def keys(self) -> List[str]:
+        return [k for k in self._ds.fields if self.get(k, _MISSING) is not _MISSING]
+
+    def to_dict(self) -> Dict[str, Any]:
+        out = {}
+        for k, col in self._ds.columns.items():
+            v = col[self._i]
+            if v is None or v == NA and type(col) in INT_COLUMNS: continue
+            out[k] = v
+        return out
+
+    @property
+    def id(self) -> int:
+        return self._i
+
+    def __repr__(self) -> str:
+        return f"Row({self.to_dict()!r})"
+
+class Dataset:
+    """Column-per-field row store: interned strings, typed int arrays for the rating columns.
+
+    A Dataset loaded from a snapshot is read-only (its columns are not appendable).
+    """
+    __slots__ = ("fields", "columns", "_n")
+
+    def __init__(self):
+        self.fields: List[str] = []
+        self.columns: Dict[str, Any] = {}
+        self._n = 0
+
+    @classmethod
+    def from_columns(cls, fields: List[str], columns: Dict[str, Any], n: int) -> "Dataset":
+        ds = cls(); ds.fields = list(fields); ds.columns = dict(columns); ds._n = n
+        return ds
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Dict[str, Any]]) -> "Dataset":
+        ds = cls()
+        for r in rows: ds.append(r)
+        return ds
+
+    def _add_field(self, k: str):
+        self.fields.append(k)
+        self.columns[k] = array("i", [NA])*self._n if k in INT_FIELDS else [None]*self._n
+
+    def _demote(self, k: str):
+        col = self.columns[k]
+        self.columns[k] = [None if v == NA else v for v in col]
+
+    def append(self, row: Dict[str, Any]):
+        i = self._n; cols = self.columns
+        for k in row:
+            if k not in cols: self._add_field(sys.intern(k))
+        for k, col in cols.items():
+            v = row.get(k)
+            if type(col) is array:
+                n = _to_int(v)
+                if n is _NOT_INT:
+                    self._demote(k); col = cols[k]
+                else:
+                    col.append(NA if n is None else n); continue
+            col.append(_intern(v))
+        self._n = i+1
+
+    def __len__(self) -> int:
+        return self._n
+
+    def __getitem__(self, i):
+        if isinstance(i, slice): return [Row(self, j) for j in range(*i.indices(self._n))]
+        if i < 0: i += self._n
+        if not 0 <= i < self._n: raise IndexError(i)
+        return Row(self, i)
+
+    def __iter__(self) -> Iterator[Row]:
+        return (Row(self, i) for i in range(self._n))
+
+    def values(self, k: str) -> List[Any]:
+        col = self.columns.get(k)
+        if col is None: return [None]*self._n
+        if type(col) in INT_COLUMNS: return [None if v == NA else v for v in col]
+        return list(col)
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        return [Row(self, i).to_dict() for i in range(self._n)]
+
+def as_dataset(data: Optional[Iterable[Dict[str, Any]]]) -> Dataset:
+    return data if isinstance(data, Dataset) else Dataset.from_rows(data or [])
@@ -0,0 +1,129 @@
+from array import array
+from bisect import bisect_left
+from typing import Dict, Any, List, Iterable, Tuple
+
+from services.store import Dataset
+from services.fuzzy import fold, query_tokens, abbreviations
+
+# keys are cut to this many folded chars; longer prefixes are matched on the cut part
+KEY_LEN = 48
+# prefixes matching more keys than this get a precomputed top list instead of a scan
+SCAN_LIMIT = 2000
+TOP_SIZE = 100
+# folded keys only hold [0-9a-z ], so this sorts after every continuation of a prefix
+_END = "{"
+
+def _int(v, default: int) -> int:
+    # demoted columns can hold "73.5" or junk; those rank like a missing value instead of failing the load
+    if v is None or v == "": return default
+    try: return int(float(v))
+    except (TypeError, ValueError, OverflowError): return default
+
+class PrefixIndex:
+    """Autocomplete over distinct (university, city) pairs.
+
+    Every word suffix of the folded name, its abbreviations and the city form a sorted key array,
+    so a typed prefix is one bisected range. Small ranges are ranked on the spot; prefixes with more
+    than SCAN_LIMIT keys (short ones like "m" or "univ") answer from a top list built with the index.
+    Suggestions rank name starts and abbreviations over inner words over the city, then by the best
+    difficulty_index among the pair's rows.
+    """
+    __slots__ = ("keys", "key_docs", "key_score", "doc_rows", "top")
+
+    def __init__(self, data: Iterable[Dict[str, Any]]):
+        docs: Dict[Tuple[str, str], int] = {}; names: List[Tuple[str, str]] = []
+        doc_rows: List[int] = []; doc_best: List[Tuple[int, int]] = []
+        if isinstance(data, Dataset):
+            rows = zip(*(data.values(k) for k in ("university", "city", "difficulty_index", "rating_position")))
+        else:
+            rows = ((r.get("university"), r.get("city"), r.get("difficulty_index"), r.get("rating_position")) for r in data)
+        for i, (uni, city, diff, pos) in enumerate(rows):
+            uni = str(uni or ""); city = str(city or "")
+            if not uni: continue
+            best = (_int(diff, -1), -_int(pos, 10**9))
+            d = docs.get((uni, city))
+            if d is None:
+                d = docs[(uni, city)] = len(names); names.append((uni, city)); doc_rows.append(i); doc_best.append(best)
+            elif best > doc_best[d]:
+                doc_rows[d] = i; doc_best[d] = best
+        order = sorted(range(len(names)), key=lambda d: (-doc_best[d][0], len(names[d][0]), names[d][0]))
+        rank = [0]*len(names)
+        for n, d in enumerate(order): rank[d] = n
+        ndocs = len(names); ek: List[str] = []; ed: List[int] = []; es: List[int] = []
+        city_keys: Dict[str, str] = {}
+        for d, (uni, city) in enumerate(names):
+            f = fold(uni); keys: Dict[str, int] = {f[:KEY_LEN]: 0} if f else {}
+            start = f.find(" ")
+            while start >= 0:
+                keys.setdefault(f[start+1:start+1+KEY_LEN], 1); start = f.find(" ", start+1)
+            for a in abbreviations(uni): keys[a[:KEY_LEN]] = 0
+            c = city_keys.get(city)
+            if c is None: c = city_keys[city] = fold(city)[:KEY_LEN]
+            if c: keys.setdefault(c, 2)
+            r = rank[d]
+            for key, tier in keys.items():
+                ek.append(key); ed.append(d); es.append(tier*ndocs + r)
+        order = sorted(range(len(ek)), key=ek.__getitem__)  # a list of str keys sorts on the fast str path
+        self.keys = [ek[e] for e in order]
+        self.key_docs = array("I", (ed[e] for e in order))
+        self.key_score = array("I", (es[e] for e in order))
+        self.doc_rows = array("I", doc_rows)
+        self.top = self._top_lists()
+
+    def _big_prefixes(self) -> Dict[str, None]:
+        """Prefixes (and "") whose key range exceeds SCAN_LIMIT, found by descending only into big ranges."""
+        keys = self.keys; big: Dict[str, None] = {}
+        stack = [("", 0, len(keys))]
+        while stack:
+            p, lo, hi = stack.pop()
+            if hi - lo <= SCAN_LIMIT: continue
+            big[p] = None; L = len(p)
+            i = bisect_left(keys, p + " ", lo, hi)  # keys equal to p itself sort first and have no next char
+            while i < hi:
+                child = keys[i][:L+1]
+                j = bisect_left(keys, child + _END, i, hi)
+                stack.append((child, i, j)); i = j
+        return big
+
+    def _top_lists(self) -> Dict[str, array]:
+        big = self._big_prefixes()
+        if not big: return {}
+        lists: Dict[str, Dict[int, None]] = {p: {} for p in big}
+        keys = self.keys; docs = self.key_docs; open_lists = len(lists)
+        # best keys first; every list fills long before the end, and the walk stops once all are full
+        for e in sorted(range(len(keys)), key=self.key_score.__getitem__):
+            key = keys[e]; d = docs[e]
+            for L in range(len(key)+1):
+                lst = lists.get(key[:L])
+                if lst is None: break  # big prefixes are closed under shortening
+                if len(lst) < TOP_SIZE and d not in lst:
+                    lst[d] = None
+                    if len(lst) == TOP_SIZE:
+                        open_lists -= 1
+                        if not open_lists: break
+            if not open_lists: break
+        return {p: array("I", lst) for p, lst in lists.items()}
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def docs(self, prefix: str, limit: int=TOP_SIZE) -> List[int]:
+        """Suggestion ids (doc numbers) for an already folded prefix, best first."""
+        p = prefix[:KEY_LEN]
+        top = self.top.get(p)
+        if top is not None: return list(top[:limit])
+        lo = bisect_left(self.keys, p); hi = bisect_left(self.keys, p + _END, lo)
+        score = self.key_score; docs = self.key_docs; out: Dict[int, None] = {}
+        for e in sorted(range(lo, hi), key=score.__getitem__):
+            out[docs[e]] = None
+            if len(out) >= limit: break
+        return list(out)
+
+    def find(self, prefix: str, limit: int=TOP_SIZE) -> List[int]:
+        """Row ids (the best-rated row of each suggested university) for a fold_prefix() result."""
+        rows = self.doc_rows
+        return [rows[d] for d in self.docs(prefix, limit)]
+
+def fold_prefix(query: str) -> str:
+    """Text as typed, folded like the keys (aliases, transliteration, punctuation)."""
+    return " ".join(query_tokens(query))
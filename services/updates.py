@@ -0,0 +1,205 @@
+import os, time, fcntl, asyncio, tempfile
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+# chats are spread over this many spool shards; each shard is drained by one process at a time
+SPOOL_SHARDS = 64
+
+def chat_key(update: Any) -> int:
+    for ev in (getattr(update, "message", None), getattr(update, "edited_message", None)):
+        if ev is not None and ev.chat is not None: return ev.chat.id
+    cq = getattr(update, "callback_query", None)
+    if cq is not None:
+        if cq.message is not None: return cq.message.chat.id
+        return cq.from_user.id
+    for name in ("inline_query", "chosen_inline_result"):
+        ev = getattr(update, name, None)
+        if ev is not None: return ev.from_user.id
+    return getattr(update, "update_id", 0)
+
+class _Handler:
+    """Runs updates through `handle` and keeps the counters and latency figures both queues report."""
+    def __init__(self, handle: Callable[[Any], Awaitable[Any]], on_error: Optional[Callable[[Exception], None]]=None,
+                 observe: Optional[Callable[[float, bool], None]]=None):
+        self._handle = handle; self._on_error = on_error; self._observe = observe
+        self.accepted = 0; self.dropped = 0; self.processed = 0; self.failed = 0
+        self.latency_sum = 0.0; self.latency_max = 0.0; self.last_latency = 0.0
+
+    async def _process(self, update: Any, t0: float, clock: Callable[[], float]=time.perf_counter):
+        ok = False
+        try:
+            await self._handle(update)
+            self.processed += 1; ok = True
+        except Exception as e:
+            self.failed += 1
+            if self._on_error: self._on_error(e)
+        finally:
+            dt = clock() - t0
+            self.latency_sum += dt; self.last_latency = dt
+            if dt > self.latency_max: self.latency_max = dt
+            if self._observe: self._observe(dt, ok)
+
+    def depth(self) -> int:
+        raise NotImplementedError
+
+    def _shape(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        done = self.processed + self.failed
+        return {**self._shape(), "depth": self.depth(),
+                "accepted": self.accepted, "dropped": self.dropped, "processed": self.processed, "failed": self.failed,
+                "latency_ms": {"avg": round(self.latency_sum/done*1e3, 2) if done else 0.0,
+                               "max": round(self.latency_max*1e3, 2), "last": round(self.last_latency*1e3, 2)}}
+
+class UpdateQueue(_Handler):
+    """Bounded webhook queue drained by a fixed pool of workers.
+
+    Updates are sharded by chat, one worker per shard, so a chat's messages are handled in order.
+    A full shard gets `put_timeout` seconds of backpressure, after that the update is dropped.
+    """
+    def __init__(self, handle: Callable[[Any], Awaitable[Any]], workers: int=4, maxsize: int=1000,
+                 put_timeout: float=0.5, on_error: Optional[Callable[[Exception], None]]=None,
+                 observe: Optional[Callable[[float, bool], None]]=None):
+        super().__init__(handle, on_error, observe)
+        workers = max(1, workers); self.put_timeout = put_timeout
+        self._queues: List[asyncio.Queue] = [asyncio.Queue(maxsize=max(1, maxsize//workers)) for _ in range(workers)]
+        self._tasks: List[asyncio.Task] = []
+
+    def depth(self) -> int:
+        return sum(q.qsize() for q in self._queues)
+
+    def _shape(self) -> Dict[str, Any]:
+        return {"workers": len(self._queues), "capacity": sum(q.maxsize for q in self._queues)}
+
+    async def submit(self, update: Any, received: Optional[float]=None) -> bool:
+        """Queues the update; latency is counted from `received` (perf_counter at webhook arrival) when given."""
+        q = self._queues[hash(chat_key(update)) % len(self._queues)]
+        item = (update, received or time.perf_counter())
+        try:
+            q.put_nowait(item)
+        except asyncio.QueueFull:
+            try: await asyncio.wait_for(q.put(item), self.put_timeout)
+            except asyncio.TimeoutError:
+                self.dropped += 1; return False
+        self.accepted += 1
+        return True
+
+    async def _worker(self, q: asyncio.Queue):
+        while True:
+            update, t0 = await q.get()
+            try: await self._process(update, t0)
+            finally: q.task_done()
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker(q)) for q in self._queues]
+
+    async def stop(self, timeout: float=10.0):
+        try: await asyncio.wait_for(asyncio.gather(*(q.join() for q in self._queues)), timeout)
+        except asyncio.TimeoutError: pass
+        for t in self._tasks: t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True); self._tasks = []
+
+class SpoolQueue(_Handler):
+    """UpdateQueue for several worker processes behind one webhook URL.
+
+    Telegram's requests land on any worker, so the per-chat order cannot come from in-process queues.
+    Every update is written to `root` as a file named by chat shard and update_id; whichever process holds
+    a shard's flock drains it oldest update_id first, so a chat is handled by one process at a time and in
+    order, while different shards run in parallel across all workers. A process drains at most `workers`
+    shards at once. The others are left to other processes or to the next sweep, which also picks up
+    shards left behind by a worker that exited. Unhandled files outlive restarts.
+    """
+    def __init__(self, root: str, handle: Callable[[Any], Awaitable[Any]], encode: Callable[[Any], bytes],
+                 decode: Callable[[bytes], Any], workers: int=4, maxsize: int=1000, shards: int=SPOOL_SHARDS,
+                 sweep_seconds: float=1.0, on_error: Optional[Callable[[Exception], None]]=None,
+                 observe: Optional[Callable[[float, bool], None]]=None):
+        super().__init__(handle, on_error, observe)
+        self.root = root; os.makedirs(root, exist_ok=True)
+        self._encode = encode; self._decode = decode
+        self.workers = max(1, workers); self.maxsize = maxsize; self.shards = shards; self.sweep_seconds = sweep_seconds
+        self._locks: Dict[int, int] = {}; self._active: Set[int] = set()
+        self._tasks: Set[asyncio.Task] = set(); self._sweeper: Optional[asyncio.Task] = None
+
+    def _pending(self, prefix: str="") -> List[str]:
+        return sorted(n for n in os.listdir(self.root) if n.endswith(".upd") and n.startswith(prefix))
+
+    def depth(self) -> int:
+        return len(self._pending())
+
+    def _shape(self) -> Dict[str, Any]:
+        return {"workers": self.workers, "capacity": self.maxsize, "shards": self.shards, "dir": self.root}
+
+    async def submit(self, update: Any, received: Optional[float]=None) -> bool:
+        """Spools the update; latency is counted from `received` (perf_counter at webhook arrival) when given."""
+        if self.depth() >= self.maxsize:
+            self.dropped += 1; return False
+        wall = time.time() - (time.perf_counter() - received if received else 0.0)
+        shard = chat_key(update) % self.shards
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix=".update-")
+        with os.fdopen(fd, "wb") as f: f.write(b"%.6f\n" % wall + self._encode(update))
+        os.replace(tmp, os.path.join(self.root, f"{shard:04d}-{update.update_id:015d}.upd"))
+        self.accepted += 1
+        self._kick(shard)
+        return True
+
+    def _kick(self, shard: int):
+        if shard in self._active or len(self._active) >= self.workers: return
+        self._active.add(shard)
+        task = asyncio.create_task(self._drain(shard))
+        self._tasks.add(task); task.add_done_callback(self._tasks.discard)
+
+    def _lock(self, shard: int) -> bool:
+        fd = self._locks.get(shard)
+        if fd is None: fd = self._locks[shard] = os.open(os.path.join(self.root, f"{shard:04d}.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try: fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError: return False
+        return True
+
+    async def _drain(self, shard: int):
+        prefix = f"{shard:04d}-"
+        try:
+            # re-checked after every unlock: a file spooled while we held the lock was not drained by its writer
+            while self._pending(prefix):
+                if not self._lock(shard): return
+                try:
+                    while True:
+                        names = self._pending(prefix)
+                        if not names: break
+                        for name in names: await self._run(os.path.join(self.root, name))
+                finally: fcntl.flock(self._locks[shard], fcntl.LOCK_UN)
+        finally:
+            self._active.discard(shard)
+
+    async def _run(self, path: str):
+        try:
+            with open(path, "rb") as f: wall, _, body = f.read().partition(b"\n")
+        except FileNotFoundError:
+            return  # drained by the previous holder of the lock just before it let go
+        try: update = self._decode(body)
+        except Exception as e:
+            self.failed += 1
+            if self._on_error: self._on_error(e)
+        else:
+            await self._process(update, float(wall), time.time)
+        # removed only once handled: a worker killed mid-update leaves it to be redone by the next holder
+        os.unlink(path)
+
+    async def _sweep(self):
+        while True:
+            try:
+                for shard in sorted({int(n[:4]) for n in self._pending()}): self._kick(shard)
+            except Exception as e:
+                if self._on_error: self._on_error(e)
+            await asyncio.sleep(self.sweep_seconds)
+
+    def start(self):
+        if self._sweeper is None: self._sweeper = asyncio.create_task(self._sweep())
+
+    async def stop(self, timeout: float=10.0):
+        if self._sweeper is not None: self._sweeper.cancel(); self._sweeper = None
+        if self._tasks: await asyncio.wait(set(self._tasks), timeout=timeout)
+        for t in list(self._tasks): t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        for fd in self._locks.values(): os.close(fd)
+        self._locks = {}
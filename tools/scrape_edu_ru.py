@@ -1,15 +1,17 @@
 
 # -*- coding: utf-8 -*-
 from __future__ import annotations
-import os, re, json, time, random, shutil
-from typing import List, Dict, Any, Optional
-import requests
+import os, re, sys, json, shutil, asyncio, argparse
 from bs4 import BeautifulSoup
-from concurrent.futures import ThreadPoolExecutor, as_completed
 
-UA = "Mozilla/5.0 (compatible; UniFinder/1.0; +https://github.com/German8002/uni-finder-bot)"
-HEADERS = {"User-Agent": UA, "Accept-Language": "ru,en;q=0.9"}
-SESSION = requests.Session(); SESSION.headers.update(HEADERS)
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from scraper_latest.crawler import Crawler
+from scraper_latest import http_cache
+from scraper_latest.checkpoint import open_stages, CHECKPOINT_DIR
+from scraper_latest.linkage import NameIndex, link
+from scraper_latest.wiki import fetch_summaries, TitleCache, TITLE_CACHE_PATH
+
+STAGES = ("enumerate", "ratings", "wiki", "programs")
 
 BASE_EDU = "https://www.edu.ru"
 LIST_URL  = BASE_EDU + "/vuz/"
@@ -19,19 +21,6 @@ def normalize_space(s):
     import re
     return re.sub(r"\s+", " ", (s or "").strip())
 
-def fetch(url, params=None, delay=0.8, timeout=30.0, allow_redirects=True):
-    for i in range(3):
-        try:
-            time.sleep(delay + random.uniform(0,0.2))
-            r = SESSION.get(url, params=params, timeout=timeout, allow_redirects=allow_redirects)
-            r.raise_for_status()
-            return r.text
-        except Exception as e:
-            if i == 2:
-                log(f"WARN fetch failed: {url} :: {e}")
-                return None
-            time.sleep(1+i)
-
 def parse_edu_list_page(html_text):
     soup = BeautifulSoup(html_text, "lxml")
     items = []
@@ -62,50 +51,59 @@ def parse_edu_list_page(html_text):
         items.append({"name": name, "city": city, "edu_page": edu_page, "site": site})
     return items
 
-def enumerate_edu_universities(max_pages=300):
-    out = []
-    for page in range(1, max_pages+1):
-        params = {"page": page}
-        log(f"GET {LIST_URL} page={page}")
-        html_text = fetch(LIST_URL, params=params)
-        if not html_text:
-            if page == 1: html_text = fetch(LIST_URL, params=None)
-            if not html_text: break
-        rows = parse_edu_list_page(html_text)
-        log(f"Parsed page {page}: {len(rows)} items")
-        if not rows and page > 2: break
-        out.extend(rows)
-    seen=set(); uniq=[]
-    for r in out:
-        key=(r.get("name","").lower(), (r.get("edu_page") or "").lower())
-        if key in seen: continue
-        seen.add(key); uniq.append(r)
+def _uni_key(r):
+    return (r.get("name","").lower(), (r.get("edu_page") or "").lower())
+
+def uni_key(r):
+    return "\t".join(_uni_key(r))
+
+async def _step(ck, stage, key, fetch, run=True):
+    """Result of one unit of work: from the stage checkpoint when already done, else fetched and recorded.
+
+    `fetch` returns None on failure, which is recorded as failed and redone on resume. With run=False
+    nothing is fetched and the last checkpointed value (or None) is returned.
+    """
+    cp = ck.get(stage) if ck else None
+    if cp is not None and (not run or cp.done(key)): return cp.value(key)
+    if not run: return None
+    res = await fetch()
+    if cp is not None: cp.record(key, res, ok=res is not None)
+    return res
+
+async def list_page(crawler, p, ck=None, run=True):
+    async def fetch():
+        html_text = await crawler.fetch(LIST_URL, params={"page": p})
+        if not html_text and p == 1: html_text = await crawler.fetch(LIST_URL)
+        return parse_edu_list_page(html_text) if html_text else None
+    return await _step(ck, "enumerate", f"page:{p}", fetch, run)
+
+async def enumerate_edu_universities(crawler, max_pages=300, out=None, window=4, ck=None, run=True):
+    """Walks the list pages `window` at a time; new universities also go to the `out` queue as they are parsed."""
+    seen=set(); uniq=[]; page=1; done=False
+    while page<=max_pages and not done:
+        pages=list(range(page, min(page+window, max_pages+1)))
+        if run: log(f"GET {LIST_URL} pages {pages[0]}..{pages[-1]}")
+        pages_rows=await asyncio.gather(*(list_page(crawler, p, ck, run) for p in pages))
+        for p, rows in zip(pages, pages_rows):
+            if rows is None: done=True; break
+            log(f"Parsed page {p}: {len(rows)} items")
+            if not rows and p > 2: done=True; break
+            for r in rows:
+                key=_uni_key(r)
+                if key in seen: continue
+                seen.add(key); uniq.append(r)
+                if out is not None: await out.put(r)
+        page+=window
     log(f"Total universities from edu.ru: {len(uniq)}")
     return uniq
 
-def norm_name(s):
-    s=(s or "").lower().replace("«","").replace("»","").replace('"',"").replace("'","")
-    import re
-    s=re.sub(r"\s+"," ",s).strip()
-    for k,v in {
-        "федеральное государственное бюджетное образовательное учреждение высшего образования ":"",
-        "национальный исследовательский ":"",
-        "федеральный ":"",
-        "имени ":"им ",
-        "университет имени":"университет им",
-        "российский ":"",
-        "государственный ":"",
-    }.items(): s=s.replace(k,v)
-    return s
-
-def parse_raex(year=2024):
-    from bs4 import BeautifulSoup
+async def parse_raex(crawler, year=2024):
     ranks={}
     for url in [
         f"https://raex-rr.com/education/russian_universities/top-200_universities/{year}/",
         f"https://raex-rr.com/education/russian_universities/top-100_universities/{year}/",
     ]:
-        html_text = fetch(url, delay=1.2)
+        html_text = await crawler.fetch(url)
         if not html_text: continue
         soup=BeautifulSoup(html_text,"lxml")
         for tr in soup.select("table tr"):
@@ -118,20 +116,19 @@ def parse_raex(year=2024):
             a=tr.find("a")
             name=normalize_space(a.get_text()) if a and a.get_text() else _re.sub(r"^\s*#?\d+\s*","",txt)
             if name and len(name)>=4:
-                key=norm_name(name); ranks.setdefault(key,pos)
+                ranks.setdefault(name,pos)
         if not ranks:
             for i, el in enumerate(soup.select("article, .rating-card, .rating__row, .list-item"),1):
                 name=normalize_space(el.get_text())
                 if len(name)>=4:
-                    key=norm_name(name); ranks.setdefault(key,i)
+                    ranks.setdefault(name,i)
     log(f"RAEX {year}: {len(ranks)} entries")
     return ranks
 
-def parse_interfax(year=2024):
-    from bs4 import BeautifulSoup
+async def parse_interfax(crawler, year=2024):
     ranks={}
     for url in ["https://academia.interfax.ru/ru/ratings/national","https://academia.interfax.ru/ru/ratings/","https://academia.interfax.ru/"]:
-        html_text=fetch(url, delay=1.0)
+        html_text=await crawler.fetch(url)
         if not html_text: continue
         soup=BeautifulSoup(html_text,"lxml")
         rows=0
@@ -141,14 +138,13 @@ def parse_interfax(year=2024):
             a=tr.find("a")
             name=normalize_space(a.get_text()) if a and a.get_text() else txt
             if name and len(name)>=4:
-                key=norm_name(name)
-                if key not in ranks:
-                    ranks[key]=len(ranks)+1; rows+=1
+                if name not in ranks:
+                    ranks[name]=len(ranks)+1; rows+=1
         if rows<10:
             for el in soup.select(".rating-row, .list-item, li, .row"):
                 name=normalize_space(el.get_text())
                 if name and len(name)>=4:
-                    key=norm_name(name); ranks.setdefault(key,len(ranks)+1)
+                    ranks.setdefault(name,len(ranks)+1)
     log(f"Interfax {year}: {len(ranks)} entries")
     return ranks
 
@@ -159,31 +155,10 @@ def difficulty_from_best(best):
     if best>150: return "низкая"
     return None
 
-WIKI_API="https://ru.wikipedia.org/w/api.php"
-def wiki_fetch_summary(title):
-    params={"action":"query","format":"json","prop":"extracts|info","inprop":"url","exintro":1,"explaintext":1,"redirects":1,"titles":title}
-    try:
-        r=SESSION.get(WIKI_API, params=params, timeout=30); r.raise_for_status()
-        data=r.json()
-    except Exception:
-        return {}
-    pages=data.get("query",{}).get("pages",{})
-    for pid, page in pages.items():
-        try:
-            if int(pid)<0: continue
-        except Exception:
-            pass
-        out={"page":page.get("fullurl"), "summary": (page.get("extract") or "")[:800] or None}
-        if out["summary"]:
-            import re as _re
-            m=_re.search(r"(основан[ао]?|год основан[ия]|учрежд[её]н[ао]?)\D{0,20}(\d{3,4})", out["summary"], _re.I)
-            if m: out["founded"]=m.group(2)
-        return out
-    return {}
-
-def try_extract_programs_link(edu_page):
-    if not edu_page: return None
-    html_text=fetch(edu_page, delay=0.6, timeout=30)
+async def try_extract_programs_link(crawler, edu_page):
+    """Programs link from the edu.ru page, "" when there is none, None when the page could not be fetched."""
+    if not edu_page: return ""
+    html_text=await crawler.fetch(edu_page)
     if not html_text: return None
     soup=BeautifulSoup(html_text,"lxml")
     for a in soup.select("a"):
@@ -191,46 +166,116 @@ def try_extract_programs_link(edu_page):
         if any(k in text.lower() for k in ["направлен","программ","абитуриент","приём","прием"]):
             if not href.startswith("http"): href=BASE_EDU+href
             return href
-    return None
+    return ""
 
-def enrich_with_ratings(unis):
-    raex=parse_raex(2024); interfax=parse_interfax(2024)
+def apply_ratings(u, matches):
+    """matches: {source: (position, confidence)} for the rating tables this university was linked to."""
+    rpos=matches.get("raex",(None,))[0]; ipos=matches.get("interfax",(None,))[0]
+    rating=None
+    if rpos or ipos:
+        best=min([p for p in [rpos,ipos] if p is not None])
+        rating={"raex":rpos,"interfax":ipos,"difficulty":difficulty_from_best(best),
+                "confidence":min(c for _, c in matches.values())}
+    u["rating"]=rating
+
+def link_ratings(unis, raex, interfax):
+    """Links every rating table (name -> position) to the university list through a blocking index."""
+    names=[u.get("name","") for u in unis]; found={}
+    for src, ranks in (("raex", raex), ("interfax", interfax)):
+        if not ranks: continue
+        titles=list(ranks)
+        for q, (i, conf) in link(NameIndex(titles), names).items():
+            found.setdefault(q, {})[src]=(ranks[titles[i]], conf)
+    for q, u in enumerate(unis): apply_ratings(u, found.get(q, {}))
+
+async def load_ratings(crawler, year=2024, ck=None, run=True):
+    """(raex, interfax) rank maps; a source whose page yielded nothing counts as failed."""
+    async def fetch(parse):
+        ranks=await parse(crawler, year)
+        return ranks or None
+    raex, interfax = await asyncio.gather(_step(ck, "ratings", f"raex:{year}", lambda: fetch(parse_raex), run),
+                                          _step(ck, "ratings", f"interfax:{year}", lambda: fetch(parse_interfax), run))
+    return raex or {}, interfax or {}
+
+def _set(u, field, value):
+    if value: u[field]=value
+
+async def enrich_one(crawler, u, ck=None, stages=STAGES):
+    link=await _step(ck, "programs", uni_key(u), lambda: try_extract_programs_link(crawler, u.get("edu_page")), "programs" in stages)
+    _set(u, "programs_link", link)
+
+async def enrich_with_wiki(crawler, unis, ck=None, run=True, cache=None):
+    """Wikipedia summaries for all universities through batched multi-title queries."""
+    cp=ck.get("wiki") if ck else None
+    todo=[u for u in unis if run and not (cp is not None and cp.done(uni_key(u)))]
+    res=await fetch_summaries(crawler, [u["name"] for u in todo], cache) if todo else {}
+    pending={id(u) for u in todo}
     for u in unis:
-        key=norm_name(u.get("name",""))
-        rpos=raex.get(key); ipos=interfax.get(key)
-        rating=None
-        if rpos or ipos:
-            best=min([p for p in [rpos,ipos] if p is not None]) if (rpos or ipos) else None
-            rating={"raex":rpos,"interfax":ipos,"difficulty":difficulty_from_best(best)}
-        u["rating"]=rating
-
-def enrich_with_wiki(unis, max_workers=6):
-    def task(u):
-        info=wiki_fetch_summary(u["name"])
-        if info: u["wiki"]=info
-    with ThreadPoolExecutor(max_workers=max_workers) as ex:
-        futures=[ex.submit(task,u) for u in unis]
-        for _ in as_completed(futures): pass
-
-def attach_program_links(unis, max_workers=6):
-    def task(u):
-        link=try_extract_programs_link(u.get("edu_page"))
-        if link: u["programs_link"]=link
-    with ThreadPoolExecutor(max_workers=max_workers) as ex:
-        futures=[ex.submit(task,u) for u in unis]
-        for _ in as_completed(futures): pass
+        key=uni_key(u)
+        if id(u) in pending:
+            v=res.get(u["name"])
+            if cp is not None: cp.record(key, v, ok=v is not None)
+        else:
+            v=cp.value(key) if cp is not None else None
+        _set(u, "wiki", v)
+
+async def crawl(crawler, max_pages=300, workers=8, ck=None, stages=STAGES, wiki_cache=None):
+    """Enumeration, ratings and per-university enrichment run as one pipeline.
+
+    Stages outside `stages` are not fetched; their results come from the checkpoints in `ck` when present.
+    """
+    ratings=asyncio.ensure_future(load_ratings(crawler, 2024, ck, "ratings" in stages))
+    q=asyncio.Queue(maxsize=workers*4); STOP=object()
+    async def worker():
+        while True:
+            u=await q.get()
+            if u is STOP: return
+            try: await enrich_one(crawler, u, ck, stages)
+            except Exception as e: log(f"WARN enrich failed for {u.get('name')}: {e}")
+    tasks=[asyncio.ensure_future(worker()) for _ in range(workers)]
+    try:
+        unis=await enumerate_edu_universities(crawler, max_pages=max_pages, out=q, ck=ck, run="enumerate" in stages)
+        wiki=asyncio.ensure_future(enrich_with_wiki(crawler, unis, ck, "wiki" in stages, wiki_cache))
+    finally:
+        for _ in tasks: await q.put(STOP)
+        await asyncio.gather(*tasks)
+    await wiki
+    raex, interfax = await ratings
+    link_ratings(unis, raex, interfax)
+    return unis
 
 def save_json(path, data):
     os.makedirs(os.path.dirname(path), exist_ok=True)
     with open(path,"w",encoding="utf-8") as f:
         json.dump(data,f,ensure_ascii=False,indent=2)
 
-def main():
-    unis=enumerate_edu_universities(max_pages=300)
+async def run(max_pages=300, workers=8, crawler=None, stages=STAGES, resume=False, checkpoint_dir=CHECKPOINT_DIR, wiki_cache=TITLE_CACHE_PATH):
+    """Runs `stages`; without `resume` their checkpoints start over, other stages are read from theirs."""
+    own = crawler is None
+    crawler = crawler or Crawler(concurrency=workers, cache=http_cache.shared())
+    ck = open_stages(STAGES, stages, resume, checkpoint_dir) if checkpoint_dir else None
+    titles = TitleCache(wiki_cache) if wiki_cache else None
+    try:
+        unis=await crawl(crawler, max_pages=max_pages, workers=workers, ck=ck, stages=stages, wiki_cache=titles)
+    finally:
+        log(f"HTTP: {crawler.stats()}")
+        if titles is not None: titles.close()
+        if ck:
+            for name, cp in ck.items(): log(f"checkpoint {name}: {cp.stats()}"); cp.close()
+        if own: await crawler.close()
     if len(unis)<200: log("WARN: мало записей; возможно изменена верстка.")
-    enrich_with_ratings(unis)
-    enrich_with_wiki(unis, max_workers=6)
-    attach_program_links(unis, max_workers=6)
+    return unis
+
+def main(argv=None):
+    ap=argparse.ArgumentParser(description="edu.ru + ratings + Wikipedia scrape")
+    ap.add_argument("--stage", choices=("all",)+STAGES, default="all", help="run only this stage, the rest comes from checkpoints")
+    ap.add_argument("--resume", action="store_true", help="skip work already recorded in the checkpoints")
+    ap.add_argument("--max-pages", type=int, default=300)
+    ap.add_argument("--workers", type=int, default=8)
+    ap.add_argument("--checkpoint-dir", default=CHECKPOINT_DIR)
+    args=ap.parse_args(argv)
+    stages=STAGES if args.stage=="all" else (args.stage,)
+    unis=asyncio.run(run(max_pages=args.max_pages, workers=args.workers, stages=stages, resume=args.resume, checkpoint_dir=args.checkpoint_dir))
 
     out=[]; seen=set()
     for u in unis: